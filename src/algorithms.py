@@ -8,37 +8,1037 @@ multi-objective kernelized bandits optimization problem.
    *The MIT Press*
 """
 
+import copy
+
 import numpy
 
-from sklearn.gaussian_process import GaussianProcessRegressor
-from sklearn.gaussian_process.kernels import RBF
+from scipy.linalg import cho_solve, cholesky, solve_triangular
+from scipy.linalg.lapack import dtrtri
+from scipy.spatial.distance import cdist
+
+
+def rbf(X1, X2, bandwidth):
+    """Evaluate the RBF kernel :math:`k(x, x') = e^{-\\|(x - x') / l\\|^2 / 2}` of given
+    *bandwidth* :math:`l` between every pair of points of *X1* and *X2*.
+
+    :param X1: A 2d array of locations.
+    :param X2: A 2d array of locations.
+    :param bandwidth: The bandwidth of the RBF kernel (scalar or one value per dimension).
+    :returns: The kernel matrix of shape (len(*X1*), len(*X2*)).
+    """
+    bandwidth = numpy.asarray(bandwidth, dtype=float)
+    dists = cdist(numpy.asarray(X1, dtype=float) / bandwidth,
+                  numpy.asarray(X2, dtype=float) / bandwidth, metric="sqeuclidean")
+    return numpy.exp(-0.5 * dists)
+
+
+def normalize(y, counts=None, m2=0):
+    """Center and scale observations as done by :mod:`sklearn` Gaussian processes with
+    `normalize_y=True`. With *counts*, each observation is the mean of repeated observations
+    (see :class:`AggregatedObservations`) and the mean and standard deviation are those of
+    the repeated observations.
+
+    :param y: Observations (1d or 2d array, one column per output).
+    :param counts: The number of repeated observations of each row of *y* (default: None).
+    :param m2: The sums of squared deviations from the mean of each row of *y*, with the
+               shape of *y* (default: 0).
+    :returns: The normalized observations, their mean and their standard deviation.
+    """
+    y = numpy.asarray(y, dtype=float)
+    if counts is None:
+        mean = numpy.mean(y, axis=0)
+        std = numpy.std(y, axis=0)
+    else:
+        counts = numpy.reshape(numpy.asarray(counts, dtype=float), (-1,) + (1,) * (y.ndim - 1))
+        n = numpy.sum(counts)
+        mean = numpy.sum(counts * y, axis=0) / n
+        m2 = numpy.sum(numpy.broadcast_to(m2, y.shape), axis=0)
+        std = numpy.sqrt((m2 + numpy.sum(counts * (y - mean)**2, axis=0)) / n)
+    std = numpy.where(std < 10 * numpy.finfo(float).eps, 1.0, std)
+    return (y - mean) / std, mean, std
+
+
+def inducing_grid(axes, n_inducing):
+    """Select at most *n_inducing* points forming a regular sub-grid of the Cartesian grid
+    defined by *axes*, e.g. to use as the inducing points of a :class:`SparseKernelFactor`.
+    The budget is shared between dimensions, the shortest axes being kept whole when they
+    have fewer values than their share.
+
+    :param axes: A list of 1d arrays of grid values per dimension.
+    :param n_inducing: The maximal number of inducing points.
+    :returns: A 2d array of inducing points, one per row.
+    """
+    axes = [numpy.asarray(axis, dtype=float) for axis in axes]
+    subaxes = [None] * len(axes)
+    budget = max(1, n_inducing)
+    for i, d in enumerate(numpy.argsort([axis.shape[0] for axis in axes])):
+        share = numpy.floor(budget ** (1 / (len(axes) - i)) + 1e-9)
+        m = int(min(axes[d].shape[0], max(1, share)))
+        subaxes[d] = axes[d][numpy.unique(numpy.round(numpy.linspace(0, axes[d].shape[0] - 1, m)).astype(int))]
+        budget //= subaxes[d].shape[0]
+    grid = numpy.meshgrid(*subaxes)
+    return numpy.vstack([numpy.ravel(g) for g in grid]).T
+
+
+class ObservationBuffer:
+    """Growable storage of observed locations and, optionally, observations. The data is
+    kept in contiguous arrays whose capacity is doubled when full, so that appending is
+    amortized :math:`O(1)` per observation and the history is never copied on every step.
+    The observations are read through views of the arrays (see :attr:`X` and :attr:`y`).
+
+    :param capacity: The initial capacity (default: 64).
+    """
+    def __init__(self, capacity=64):
+        self.capacity = capacity
+        self.X_data = None
+        self.y_data = None
+        self.n = 0
+
+    def __len__(self):
+        return self.n
+
+    @property
+    def X(self):
+        """A view of the observed locations (2d array), or None if empty."""
+        return self.X_data[:self.n] if self.n > 0 else None
+
+    @property
+    def y(self):
+        """A view of the observations (1-D array), or None if empty or not stored."""
+        return self.y_data[:self.n] if self.n > 0 and self.y_data is not None else None
+
+    def append(self, X, y=None):
+        """Append locations *X* and the associated observations *y*.
+
+        :param X: A 2d array of locations.
+        :param y: A 1-D array of observations (default: None, only locations are stored).
+        """
+        X = numpy.asarray(X, dtype=float)
+        n = self.n + X.shape[0]
+        if self.X_data is None:
+            self.X_data = numpy.empty((max(self.capacity, n), X.shape[1]))
+            if y is not None:
+                self.y_data = numpy.empty(self.X_data.shape[0])
+        elif n > self.X_data.shape[0] or not self.X_data.flags.writeable:
+            # read-only arrays (e.g. memory-mapped by load) are copied on first write
+            capacity = max(2 * self.X_data.shape[0], n)
+            self.X_data = numpy.resize(self.X_data, (capacity, self.X_data.shape[1]))
+            if self.y_data is not None:
+                self.y_data = numpy.resize(self.y_data, capacity)
+        self.X_data[self.n:n] = X
+        if self.y_data is not None:
+            self.y_data[self.n:n] = y
+        self.n = n
+
+    def clear(self):
+        """Forget every observation while keeping the allocated memory."""
+        self.n = 0
+
+    def copy(self):
+        """Return a copy of the buffer, where only the stored observations are copied.
+
+        :returns: An :class:`ObservationBuffer`.
+        """
+        buffer = copy.copy(self)
+        buffer.X_data = None if self.X is None else numpy.array(self.X)
+        buffer.y_data = None if self.y is None else numpy.array(self.y)
+        return buffer
+
+    def load(self, X, y=None):
+        """Replace the content of the buffer by locations *X* and observations *y*. The
+        arrays are used as is, e.g. memory-mapped, until they are written.
+
+        :param X: A 2d array of locations, or None to empty the buffer.
+        :param y: A 1-D array of observations (default: None).
+        """
+        self.X_data, self.y_data = X, y
+        self.n = 0 if X is None else X.shape[0]
+
+
+class AggregatedObservations(ObservationBuffer):
+    """Growable storage of observations where repeated observations at the same location
+    are aggregated. Only the unique locations are kept, with the number of observations,
+    their mean (see :attr:`y`) and the sum of their squared deviations from the mean,
+    updated with Welford's algorithm. A regression model whose noise variance at each
+    location is divided by its count (see :class:`KernelFactor`) has the same posterior as
+    the model fitted on every repeated observation, while the number of locations can be
+    much smaller, e.g. when the observations are all on a grid.
+
+    :param capacity: The initial capacity (default: 64).
+    """
+    def __init__(self, capacity=64):
+        super().__init__(capacity)
+        self.counts_data = None
+        self.m2_data = None
+        self.index = {}
+
+    @property
+    def counts(self):
+        """A view of the number of observations at each location (1-D array), or None."""
+        return self.counts_data[:self.n] if self.n > 0 else None
+
+    @property
+    def m2(self):
+        """A view of the sums of squared deviations of the observations from their mean at
+        each location (1-D array), or None."""
+        return self.m2_data[:self.n] if self.n > 0 else None
+
+    def reserve(self):
+        """Make the statistics arrays as large as the locations array and writable."""
+        capacity = self.X_data.shape[0]
+        if self.counts_data is None:
+            self.counts_data, self.m2_data = numpy.zeros(capacity), numpy.zeros(capacity)
+        elif self.counts_data.shape[0] != capacity or not self.counts_data.flags.writeable:
+            self.counts_data = numpy.resize(self.counts_data, capacity)
+            self.m2_data = numpy.resize(self.m2_data, capacity)
+        if not self.y_data.flags.writeable:
+            self.y_data = numpy.array(self.y_data)
+
+    def append(self, X, y=None):
+        """Append locations *X* and the associated observations *y*. The observations at
+        known locations update the statistics of these locations.
+
+        :param X: A 2d array of locations.
+        :param y: A 1-D array of observations.
+        """
+        X = numpy.asarray(X, dtype=float)
+        y = numpy.asarray(y, dtype=float)
+        for x, value in zip(X, y):
+            key = x.tobytes()
+            i = self.index.get(key)
+            if i is None:
+                self.index[key] = self.n
+                super().append(x[None], value[None])
+                self.reserve()
+                self.counts_data[self.n - 1], self.m2_data[self.n - 1] = 1, 0
+            else:
+                self.reserve()
+                self.counts_data[i] += 1
+                deviation = value - self.y_data[i]
+                self.y_data[i] += deviation / self.counts_data[i]
+                self.m2_data[i] += deviation * (value - self.y_data[i])
+
+    def clear(self):
+        """Forget every observation while keeping the allocated memory."""
+        super().clear()
+        self.index = {}
+
+    def copy(self):
+        """Return a copy of the buffer, where only the stored statistics are copied.
+
+        :returns: An :class:`AggregatedObservations`.
+        """
+        buffer = super().copy()
+        buffer.counts_data = None if self.counts is None else numpy.array(self.counts)
+        buffer.m2_data = None if self.m2 is None else numpy.array(self.m2)
+        buffer.index = dict(self.index)
+        return buffer
+
+    def load(self, X, y=None, counts=None, m2=None):
+        """Replace the content of the buffer by locations *X* and the statistics of their
+        observations. The arrays are used as is, e.g. memory-mapped, until they are written.
+
+        :param X: A 2d array of unique locations, or None to empty the buffer.
+        :param y: A 1-D array of mean observations (default: None).
+        :param counts: A 1-D array of numbers of observations (default: None, one per location).
+        :param m2: A 1-D array of sums of squared deviations (default: None, zeros).
+        """
+        super().load(X, y)
+        if X is not None:
+            counts = numpy.ones(self.n) if counts is None else counts
+            m2 = numpy.zeros(self.n) if m2 is None else m2
+        self.counts_data, self.m2_data = counts, m2
+        self.index = {} if X is None else {numpy.asarray(x, dtype=float).tobytes(): i for i, x in enumerate(X)}
+
+
+def shared_regularization(lambda_):
+    """Return the regularization shared by several outputs, i.e. *lambda_* as a scalar if it
+    is a scalar or an array of identical values, or the 1-D array of regularizations otherwise.
+
+    :param lambda_: A regularization, or a 1-D array of regularizations, one per output.
+    :returns: A float or a 1-D array.
+    """
+    lambda_ = numpy.asarray(lambda_, dtype=float)
+    if lambda_.ndim == 0:
+        return float(lambda_)
+    if lambda_.size > 0 and numpy.all(lambda_ == lambda_[0]):
+        return float(lambda_[0])
+    return lambda_
+
+
+def round_regularization(lambda_, rtol):
+    """Round a regularization to the geometric grid of ratio :math:`1 + rtol`, i.e. to the
+    closest :math:`(1 + rtol)^k` for an integer :math:`k`. The regularizations of the noise
+    bounds (see :func:`estimate_noise`) drift a little at every update, and rounding them
+    allows to reuse and extend the same factorization (see :func:`KernelFactor.cholesky`)
+    until they drift by more than about *rtol*.
+
+    :param lambda_: The regularization :math:`\\lambda`.
+    :param rtol: The relative precision of the rounded regularization (0 to keep *lambda_*).
+    :returns: A float.
+    """
+    if rtol <= 0:
+        return float(lambda_)
+    step = numpy.log1p(rtol)
+    return float(numpy.exp(numpy.round(numpy.log(lambda_) / step) * step))
+
+
+def triangular_inverse(L):
+    """Inverse of a lower triangular matrix, computed by LAPACK in :math:`N^3/3` operations
+    instead of solving a triangular system for every column of the identity.
+
+    :param L: A lower triangular 2d array.
+    :returns: The lower triangular 2d array :math:`L^{-1}`.
+    """
+    L_inv, info = dtrtri(L, lower=1)
+    if info != 0:
+        raise numpy.linalg.LinAlgError("Singular triangular matrix.")
+    return numpy.tril(L_inv)
+
+
+def read_only(array):
+    """Return a read-only view of *array*, e.g. to share it until it is written.
+
+    :param array: An array.
+    :returns: A view of *array* that cannot be written.
+    """
+    view = array.view()
+    view.flags.writeable = False
+    return view
+
+
+def cholesky_update(L, i, delta):
+    """Update in place the lower Cholesky factor *L* of a matrix :math:`A` to the factor of
+    :math:`A + \\delta e_i e_i^T` in :math:`O(N(N - i))`. Only the trailing block
+    `L[i:, i:]` is modified. A negative *delta* (downdate) must keep the matrix positive definite.
+
+    :param L: A lower triangular 2d array (writable).
+    :param i: The index of the modified diagonal element.
+    :param delta: The value added to the diagonal element.
+    """
+    sign = numpy.sign(delta)
+    x = numpy.zeros(L.shape[0])
+    x[i] = numpy.sqrt(abs(delta))
+    for k in range(i, L.shape[0]):
+        r = numpy.sqrt(L[k, k]**2 + sign * x[k]**2)
+        c, s = r / L[k, k], x[k] / L[k, k]
+        L[k, k] = r
+        L[k+1:, k] = (L[k+1:, k] + sign * s * x[k+1:]) / c
+        x[k+1:] = c * x[k+1:] - s * L[k+1:, k]
+
+
+class KernelFactor:
+    """Persistent Cholesky factorization :math:`LL^T = K + \\lambda I` of the RBF kernel
+    matrix :math:`K` of some observed locations. When new locations are appended, the
+    factorization is extended by a rank-k block update in :math:`O(N^2k)` instead of being
+    recomputed in :math:`O(N^3)`. One factorization is kept for each of the few most
+    recently used regularizations :math:`\\lambda`. The locations are kept in an
+    :class:`ObservationBuffer` and the factors in arrays whose capacity is doubled when full.
+    Outputs with different regularizations are predicted together, each from the factorization
+    of its regularization, so that only the kernel vectors of the predicted locations are shared.
+
+    The prediction functions reproduce :class:`sklearn.gaussian_process.GaussianProcessRegressor`
+    with a fixed RBF kernel, `alpha=lambda_` and `normalize_y=True` [Williams2006]_. They
+    optionally take the *counts* of repeated observations aggregated at every location (see
+    :class:`AggregatedObservations`), in which case the noise variance of a location is
+    divided by its count.
+
+    :param bandwidth: The bandwidth of the RBF kernel.
+    :param max_factors: The maximal number of regularizations for which a factorization
+                        is kept in memory (default: 4).
+    """
+    def __init__(self, bandwidth, max_factors=4):
+        self.bandwidth = bandwidth
+        self.max_factors = max_factors
+        self.locations = ObservationBuffer()
+        self.factors = {}
+
+    @property
+    def X(self):
+        """A view of the locations known to the factorization (2d array), or None."""
+        return self.locations.X
+
+    def sync(self, X):
+        """Make the locations known to the factorization match *X*. If *X* extends the
+        known locations, the new locations are appended. If the known locations extend
+        *X*, the leading block of each factorization is used as is. Otherwise, every
+        factorization is discarded.
+
+        :param X: A 2d array of locations.
+        :returns: The number of locations in *X*.
+        """
+        X = numpy.asarray(X, dtype=float)
+        n = X.shape[0]
+        m = min(n, len(self.locations))
+        if m > 0 and not numpy.array_equal(self.X[:m], X[:m]):
+            self.locations.clear()
+            self.factors = {}
+        if n > len(self.locations):
+            self.locations.append(X[len(self.locations):])
+        return n
+
+    def cholesky(self, X, lambda_, inverse_diagonal=False, counts=None):
+        """Lower Cholesky factor of :math:`K + \\lambda N^{-1}` on locations *X*, where
+        :math:`N` is the diagonal matrix of *counts* (identity by default). The factor is
+        extended with the locations appended since its last use, and updated by rank-one
+        updates (see :func:`cholesky_update`) at the locations whose count changed.
+
+        Once requested, the diagonal of :math:`(K + \\lambda N^{-1})^{-1}` is computed from the
+        factor (see :func:`triangular_inverse`) and then maintained along it: a rank-k extension
+        updates it in :math:`O(N^2k)` using the inverse of the bordered matrix, and a change of
+        count by the Sherman-Morrison formula.
+
+        :param X: A 2d array of locations.
+        :param lambda_: The regularization :math:`\\lambda`.
+        :param inverse_diagonal: If True, also return the diagonal of :math:`(K + \\lambda N^{-1})^{-1}`.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :returns: A lower triangular 2d array (view), and a 1-D array if requested.
+        """
+        n = self.sync(X)
+        counts = numpy.ones(n) if counts is None else numpy.asarray(counts, dtype=float)
+        L, m, d, c = self.factors.pop(lambda_, (numpy.zeros((0, 0)), 0, None, numpy.zeros(0)))
+        if inverse_diagonal and d is None:
+            d = numpy.zeros(L.shape[0])
+            if m > 0:
+                d[:m] = numpy.sum(triangular_inverse(L[:m, :m])**2, axis=0)
+        k = min(n, m)
+        changed = numpy.flatnonzero(c[:k] != counts[:k])
+        if changed.size > 0:
+            # read-only arrays (e.g. memory-mapped by load_state) are copied on first write
+            L = L if L.flags.writeable else numpy.array(L)
+            d = d if d is None or d.flags.writeable else numpy.array(d)
+            c = numpy.array(c)
+            for i in changed:
+                delta = lambda_ / counts[i] - lambda_ / c[i]
+                if d is not None:
+                    e_i = numpy.zeros(m)
+                    e_i[i] = 1
+                    u = cho_solve((L[:m, :m], True), e_i, check_finite=False)
+                    d[:m] -= delta * u**2 / (1 + delta * u[i])
+                cholesky_update(L[:m, :m], i, delta)
+                c[i] = counts[i]
+        if m < n:
+            # read-only factors (e.g. shared with a copy) are copied when extended
+            if n > L.shape[0] or not L.flags.writeable:
+                L_grown = numpy.zeros((max(2 * L.shape[0], n, 64),) * 2)
+                L_grown[:m, :m] = L[:m, :m]
+                L = L_grown
+                if d is not None:
+                    d = numpy.resize(d, L.shape[0])
+            X_new = self.X[m:n]
+            C = rbf(X_new, X_new, self.bandwidth) + numpy.diag(lambda_ / counts[m:n])
+            if m > 0:
+                S = solve_triangular(L[:m, :m], rbf(self.X[:m], X_new, self.bandwidth), lower=True, check_finite=False)
+                L[m:n, :m] = S.T
+                C -= S.T @ S
+            L[m:n, m:n] = cholesky(C, lower=True)
+            if d is not None:
+                L22_inv = triangular_inverse(L[m:n, m:n])
+                if m > 0:
+                    W = solve_triangular(L[:m, :m], S, lower=True, trans="T", check_finite=False)
+                    d[:m] += numpy.sum((W @ L22_inv.T)**2, axis=1)
+                d[m:n] = numpy.sum(L22_inv**2, axis=0)
+            c = numpy.r_[c[:m], counts[m:n]]
+            m = n
+        self.factors[lambda_] = (L, m, d, c)
+        while len(self.factors) > self.max_factors:
+            del self.factors[next(iter(self.factors))]
+        if not inverse_diagonal:
+            return L[:n, :n]
+        elif n < m:
+            # the leading block has its own inverse
+            return L[:n, :n], numpy.sum(triangular_inverse(L[:n, :n])**2, axis=0)
+        return L[:n, :n], d[:n]
+
+    def copy(self, lambdas=None):
+        """Return a copy of the factorization that can be extended independently, e.g. with
+        hallucinated observations. The locations are copied, while the factors are shared
+        as read-only arrays by both factorizations, and copied by the first one extending or
+        updating them (see :func:`cholesky`).
+
+        :param lambdas: The regularizations whose factorizations are shared with the copy
+                        (default: None, every kept factorization).
+        :returns: A :class:`KernelFactor`.
+        """
+        factor = copy.copy(self)
+        factor.locations = self.locations.copy()
+        factor.factors = {}
+        for lambda_, (L, m, d, c) in list(self.factors.items()):
+            L, d = read_only(L), None if d is None else read_only(d)
+            self.factors[lambda_] = (L, m, d, c)
+            if lambdas is None or lambda_ in lambdas:
+                factor.factors[lambda_] = (L, m, d, c)
+        return factor
+
+    def state(self, lambdas=None):
+        """Return the state of the factorization, to be saved (see :func:`load_state`).
+
+        :param lambdas: The regularizations whose factorizations are saved (default: None,
+                        every kept factorization). The others are computed again when needed.
+        :returns: A dict of metadata and a dict of arrays.
+        """
+        meta = {"class": type(self).__name__,
+                "bandwidth": numpy.ravel(self.bandwidth).astype(float).tolist(), "factors": []}
+        arrays = {"X": self.X} if self.X is not None else {}
+        factors = [(lambda_, factor) for lambda_, factor in self.factors.items() if lambdas is None or lambda_ in lambdas]
+        for i, (lambda_, (L, m, d, c)) in enumerate(factors):
+            meta["factors"].append({"lambda": float(lambda_), "m": int(m)})
+            arrays["L{}".format(i)] = L[:m, :m]
+            arrays["c{}".format(i)] = c[:m]
+            if d is not None:
+                arrays["d{}".format(i)] = d[:m]
+        return meta, arrays
+
+    def load_state(self, meta, arrays):
+        """Restore a state returned by :func:`state`. Nothing is restored if the state was
+        saved by another kind of factorization or with another bandwidth, in which case the
+        factorizations are computed again when needed.
+
+        :param meta: A dict of metadata.
+        :param arrays: A dict of arrays (e.g. memory-mapped).
+        :returns: True if the state was restored.
+        """
+        if (meta["class"] != type(self).__name__ or
+                meta["bandwidth"] != numpy.ravel(self.bandwidth).astype(float).tolist()):
+            return False
+        self.locations.load(arrays.get("X"))
+        self.factors = {}
+        for i, factor in enumerate(meta["factors"]):
+            counts = arrays.get("c{}".format(i), numpy.ones(factor["m"]))
+            self.factors[factor["lambda"]] = (arrays["L{}".format(i)], factor["m"], arrays.get("d{}".format(i)), counts)
+        return True
+
+    def in_sample(self, X, y, lambda_, counts=None, m2=0):
+        """Posterior means and variances at the observed locations *X* given observations
+        *y* (leave-in predictions). With :math:`A = K + \\lambda N^{-1}` and :math:`\\alpha = A^{-1}y`,
+        the means are :math:`y - \\lambda N^{-1}\\alpha` and the variances are
+        :math:`\\nu_i(1 - \\nu_i A^{-1}_{ii})` with :math:`\\nu_i = \\lambda / n_i`, so that no
+        :math:`O(N^3)` operation is needed once the factorization is maintained. Outputs are
+        normalized as in :func:`predict`.
+
+        :param X: A 2d array of observed locations.
+        :param y: A 1-D array of observations, or of mean observations with *counts*.
+        :param lambda_: The regularization :math:`\\lambda`.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :param m2: The sums of squared deviations of the observations per location (default: 0).
+        :returns: An array of means and an array of variances.
+        """
+        L, d = self.cholesky(X, lambda_, inverse_diagonal=True, counts=counts)
+        y_n, y_mean, y_std = normalize(y, counts, m2)
+        noise = lambda_ if counts is None else lambda_ / numpy.asarray(counts, dtype=float)
+        alpha = cho_solve((L, True), y_n, check_finite=False)
+        var = numpy.clip(noise * (1 - noise * d), 0, None)
+        return y - y_std * noise * alpha, var * y_std**2
+
+    def solve(self, X, lambda_, b, counts=None):
+        """Solve :math:`(K + \\lambda N^{-1})a = b` on locations *X*. With several
+        regularizations, one per column of *b*, the columns of every distinct regularization
+        are solved with its factorization.
+
+        :param X: A 2d array of locations.
+        :param lambda_: The regularization :math:`\\lambda`, or a 1-D array of regularizations.
+        :param b: A 1d or 2d array of right-hand sides (2d with several regularizations).
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :returns: The solution :math:`a`.
+        """
+        lambda_ = shared_regularization(lambda_)
+        if numpy.ndim(lambda_) > 0:
+            a = numpy.empty(numpy.shape(b))
+            for value in numpy.unique(lambda_):
+                cols = numpy.flatnonzero(lambda_ == value)
+                a[:, cols] = self.solve(X, value, b[:, cols], counts)
+            return a
+        return cho_solve((self.cholesky(X, lambda_, counts=counts), True), b, check_finite=False)
+
+    def predict(self, X, y, lambda_, X_pred, return_std=False, return_cov=False, counts=None, m2=0):
+        """Predict the posterior mean and, optionally, standard deviation or covariance at
+        locations *X_pred* given observations *y* at locations *X*. Several outputs observed
+        at the same locations can be predicted at once by giving one column per output in *y*.
+        With *counts*, *y* holds the means of repeated observations at every location and the
+        prediction is the same as with every repeated observation.
+
+        The outputs may have different regularizations, in which case every distinct
+        regularization is predicted with its persistent factorization (see :func:`cholesky`)
+        and the kernel vectors of *X_pred* are computed once for all of them.
+
+        :param X: A 2d array of observed locations.
+        :param y: A 1-D array of observations, or a 2d array with one column per output.
+        :param lambda_: The regularization :math:`\\lambda`, or a 1-D array of regularizations,
+                        one per column of *y*.
+        :param X_pred: A 2d array of locations at which to predict.
+        :param return_std: If True, also return the standard deviations.
+        :param return_cov: If True, also return the covariance matrix (1-D *y* and a single
+                           regularization only).
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :param m2: The sums of squared deviations of the observations per location, with
+                   the shape of *y* (default: 0).
+        :returns: An array of means, and an array of standard deviations or a covariance
+                  matrix if requested.
+        """
+        lambda_ = shared_regularization(lambda_)
+        if numpy.ndim(lambda_) > 0:
+            if return_cov:
+                raise ValueError("The covariance is only computed for a single regularization.")
+            y_n, y_mean, y_std = normalize(y, counts, m2)
+            n = self.sync(X)
+            K_trans = rbf(X_pred, self.X[:n], self.bandwidth)
+            mean, var = numpy.empty((X_pred.shape[0], y_n.shape[1])), numpy.empty((X_pred.shape[0], y_n.shape[1]))
+            for value in numpy.unique(lambda_):
+                cols = numpy.flatnonzero(lambda_ == value)
+                L = self.cholesky(X, value, counts=counts)
+                mean[:, cols] = K_trans @ cho_solve((L, True), y_n[:, cols], check_finite=False)
+                if return_std:
+                    V = solve_triangular(L, K_trans.T, lower=True, check_finite=False)
+                    var[:, cols] = numpy.clip(1 - numpy.einsum("ij,ij->j", V, V), 0, None)[:, None]
+            mean = y_mean + y_std * mean
+            return (mean, numpy.sqrt(var) * y_std) if return_std else mean
+        L = self.cholesky(X, lambda_, counts=counts)
+        y_n, y_mean, y_std = normalize(y, counts, m2)
+        K_trans = rbf(X_pred, self.X[:L.shape[0]], self.bandwidth)
+        mean = y_mean + y_std * (K_trans @ cho_solve((L, True), y_n, check_finite=False))
+        if return_std:
+            V = solve_triangular(L, K_trans.T, lower=True, check_finite=False)
+            var = numpy.clip(1 - numpy.einsum("ij,ij->j", V, V), 0, None)
+            if y_n.ndim > 1:
+                var = var[:, None]
+            return mean, numpy.sqrt(var) * y_std
+        if return_cov:
+            return mean, self.covariance(X, lambda_, X_pred, counts) * y_std**2
+        return mean
+
+    def covariance(self, X, lambda_, X_pred, counts=None):
+        """Posterior covariance :math:`K_{**} - K_{*X}(K + \\lambda N^{-1})^{-1}K_{X*}` at
+        locations *X_pred*, for normalized outputs observed at locations *X*.
+
+        :param X: A 2d array of observed locations.
+        :param lambda_: The regularization :math:`\\lambda`.
+        :param X_pred: A 2d array of locations.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :returns: The covariance matrix.
+        """
+        L = self.cholesky(X, lambda_, counts=counts)
+        V = solve_triangular(L, rbf(self.X[:L.shape[0]], X_pred, self.bandwidth), lower=True, check_finite=False)
+        return rbf(X_pred, X_pred, self.bandwidth) - V.T @ V
+
+
+class SparseKernelFactor:
+    """Low-rank approximation of the RBF kernel through :math:`M` inducing points :math:`Z`,
+    as in the deterministic training conditional (DTC) [Quinonero2005]_. Only the projections
+    :math:`V = L_Z^{-1}K_{ZX}`, with :math:`L_Z L_Z^T = K_{ZZ}`, and the :math:`M \\times M`
+    matrix :math:`VNV^T` are kept, :math:`N` being the diagonal matrix of the counts of
+    aggregated observations (see :class:`AggregatedObservations`), or the identity. They are accumulated when new locations are appended,
+    so that the memory is :math:`O(NM)` and every prediction at the observed locations costs
+    :math:`O(NM^2)` instead of :math:`O(N^3)`.
+
+    The posterior mean is :math:`V_*^T B^{-1} V N y / \\lambda` and the posterior covariance is
+    :math:`K_{**} - V_*^T V_* + V_*^T B^{-1} V_*`, with :math:`B = I + VNV^T / \\lambda`. It exposes
+    the prediction functions of :class:`KernelFactor` (:func:`in_sample`, :func:`predict` and
+    :func:`covariance`), with the same normalization of the outputs.
+
+    .. [Quinonero2005] Quinonero-Candela and Rasmussen (2005). A unifying view of sparse
+       approximate Gaussian process regression. *JMLR*
+
+    :param bandwidth: The bandwidth of the RBF kernel.
+    :param inducing: A 2d array of inducing points (see :func:`inducing_grid`).
+    :param max_factors: The maximal number of regularizations for which a factorization
+                        is kept in memory (default: 4).
+    :param jitter: A small value added to the diagonal of :math:`K_{ZZ}` (default: 1e-8).
+    """
+    def __init__(self, bandwidth, inducing, max_factors=4, jitter=1e-8):
+        self.bandwidth = bandwidth
+        self.max_factors = max_factors
+        self.inducing = numpy.asarray(inducing, dtype=float)
+        M = self.inducing.shape[0]
+        K_ZZ = rbf(self.inducing, self.inducing, bandwidth) + jitter * numpy.identity(M)
+        self.L_Z = cholesky(K_ZZ, lower=True)
+        self.locations = ObservationBuffer()
+        self.projections = ObservationBuffer()
+        self.VVT = numpy.zeros((M, M))
+        self.revision = 0
+        self.factors = {}
+
+    @property
+    def X(self):
+        """A view of the locations known to the factorization (2d array), or None."""
+        return self.locations.X
+
+    def project(self, X):
+        """Project locations *X* on the inducing points.
+
+        :param X: A 2d array of locations.
+        :returns: The 2d array :math:`L_Z^{-1}K_{ZX}` of shape (:math:`M`, len(*X*)).
+        """
+        return solve_triangular(self.L_Z, rbf(self.inducing, X, self.bandwidth), lower=True)
+
+    def sync(self, X, counts=None):
+        """Make the locations known to the factorization match *X*. If *X* extends the
+        known locations, the new locations are projected and accumulated. Otherwise, the
+        accumulated projections are discarded and computed again from *X*. The projection
+        of each location is weighted by its count in :math:`VNV^T`, which is updated when a
+        count changes.
+
+        :param X: A 2d array of locations.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :returns: The number of locations in *X*.
+        """
+        X = numpy.asarray(X, dtype=float)
+        n = X.shape[0]
+        counts = numpy.ones(n) if counts is None else numpy.asarray(counts, dtype=float)
+        m = min(n, len(self.locations))
+        if n < len(self.locations) or (m > 0 and not numpy.array_equal(self.X[:m], X[:m])):
+            self.locations.clear()
+            self.projections.clear()
+            self.VVT[:] = 0
+            self.factors = {}
+            m = 0
+        if m > 0:
+            changed = numpy.flatnonzero(self.projections.y != counts[:m])
+            if changed.size > 0:
+                V = self.projections.X[changed]
+                self.VVT += (V.T * (counts[changed] - self.projections.y[changed])) @ V
+                if not self.projections.y_data.flags.writeable:
+                    self.projections.y_data = numpy.array(self.projections.y_data)
+                self.projections.y_data[changed] = counts[changed]
+                self.revision += 1
+        if n > m:
+            V = self.project(X[m:])
+            self.locations.append(X[m:])
+            self.projections.append(V.T, counts[m:])
+            self.VVT += (V * counts[m:]) @ V.T
+            self.revision += 1
+        return n
+
+    def cholesky(self, X, lambda_, counts=None):
+        """Lower Cholesky factor of :math:`B = I + VNV^T / \\lambda` on locations *X*, where
+        :math:`N` is the diagonal matrix of *counts* (identity by default). It is computed in
+        :math:`O(M^3)` whenever the locations or counts changed since its last use.
+
+        :param X: A 2d array of locations.
+        :param lambda_: The regularization :math:`\\lambda`.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :returns: A lower triangular 2d array.
+        """
+        self.sync(X, counts)
+        L, revision = self.factors.pop(lambda_, (None, -1))
+        if L is None or revision != self.revision:
+            L = cholesky(numpy.identity(self.VVT.shape[0]) + self.VVT / lambda_, lower=True)
+        self.factors[lambda_] = (L, self.revision)
+        while len(self.factors) > self.max_factors:
+            del self.factors[next(iter(self.factors))]
+        return L
+
+    def copy(self, lambdas=None):
+        """Return a copy of the factorization that can be extended independently, e.g. with
+        hallucinated observations. The projections and :math:`VNV^T` are copied, while the
+        factors, which are never modified, are shared.
+
+        :param lambdas: The regularizations whose factorizations are shared with the copy
+                        (default: None, every kept factorization).
+        :returns: A :class:`SparseKernelFactor`.
+        """
+        factor = copy.copy(self)
+        factor.locations = self.locations.copy()
+        factor.projections = self.projections.copy()
+        factor.VVT = numpy.array(self.VVT)
+        factor.factors = {lambda_: value for lambda_, value in self.factors.items()
+                          if lambdas is None or lambda_ in lambdas}
+        return factor
+
+    def state(self, lambdas=None):
+        """Return the state of the factorization, to be saved (see :func:`load_state`).
+
+        :param lambdas: The regularizations whose factorizations are saved (default: None,
+                        every kept factorization).
+        :returns: A dict of metadata and a dict of arrays.
+        """
+        meta = {"class": type(self).__name__, "revision": self.revision,
+                "bandwidth": numpy.ravel(self.bandwidth).astype(float).tolist(), "factors": []}
+        arrays = {"inducing": self.inducing, "VVT": self.VVT}
+        if self.X is not None:
+            arrays["X"], arrays["V"], arrays["counts"] = self.X, self.projections.X, self.projections.y
+        factors = [(lambda_, factor) for lambda_, factor in self.factors.items() if lambdas is None or lambda_ in lambdas]
+        for i, (lambda_, (L, revision)) in enumerate(factors):
+            meta["factors"].append({"lambda": float(lambda_), "revision": int(revision)})
+            arrays["L{}".format(i)] = L
+        return meta, arrays
+
+    def load_state(self, meta, arrays):
+        """Restore a state returned by :func:`state`. Nothing is restored if the state was
+        saved by another kind of factorization, with another bandwidth or other inducing
+        points, in which case the projections are computed again when needed.
+
+        :param meta: A dict of metadata.
+        :param arrays: A dict of arrays (e.g. memory-mapped).
+        :returns: True if the state was restored.
+        """
+        if (meta["class"] != type(self).__name__ or
+                meta["bandwidth"] != numpy.ravel(self.bandwidth).astype(float).tolist() or
+                not numpy.array_equal(arrays["inducing"], self.inducing)):
+            return False
+        self.locations.load(arrays.get("X"))
+        V = arrays.get("V")
+        self.projections.load(V, arrays.get("counts", None if V is None else numpy.ones(V.shape[0])))
+        self.VVT = numpy.array(arrays["VVT"])
+        self.revision = meta.get("revision", 0)
+        self.factors = {}
+        for i, factor in enumerate(meta["factors"]):
+            if "revision" in factor:
+                self.factors[factor["lambda"]] = (arrays["L{}".format(i)], factor["revision"])
+        return True
+
+    def in_sample(self, X, y, lambda_, counts=None, m2=0):
+        """Posterior means and variances at the observed locations *X* given observations
+        *y*, in :math:`O(NM^2)`. Outputs are normalized as in :func:`KernelFactor.predict`.
+
+        :param X: A 2d array of observed locations.
+        :param y: A 1-D array of observations, or of mean observations with *counts*.
+        :param lambda_: The regularization :math:`\\lambda`.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :param m2: The sums of squared deviations of the observations per location (default: 0).
+        :returns: An array of means and an array of variances.
+        """
+        L = self.cholesky(X, lambda_, counts)
+        y_n, y_mean, y_std = normalize(y, counts, m2)
+        V = self.projections.X.T
+        W = solve_triangular(L, V, lower=True)
+        mean = y_mean + y_std * (W.T @ (W @ (self.projections.y * y_n))) / lambda_
+        var = numpy.clip(1 - numpy.sum(V**2, axis=0) + numpy.sum(W**2, axis=0), 0, None)
+        return mean, var * y_std**2
+
+    def predict(self, X, y, lambda_, X_pred, return_std=False, return_cov=False, counts=None, m2=0):
+        """Predict the posterior mean and, optionally, standard deviation or covariance at
+        locations *X_pred* given observations *y* at locations *X* (see :func:`KernelFactor.predict`).
+        The outputs with different regularizations are predicted separately.
+
+        :param X: A 2d array of observed locations.
+        :param y: A 1-D array of observations, or a 2d array with one column per output.
+        :param lambda_: The regularization :math:`\\lambda`, or a 1-D array of regularizations,
+                        one per column of *y*.
+        :param X_pred: A 2d array of locations at which to predict.
+        :param return_std: If True, also return the standard deviations.
+        :param return_cov: If True, also return the covariance matrix (1-D *y* and a single
+                           regularization only).
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :param m2: The sums of squared deviations of the observations per location, with
+                   the shape of *y* (default: 0).
+        :returns: An array of means, and an array of standard deviations or a covariance
+                  matrix if requested.
+        """
+        lambda_ = shared_regularization(lambda_)
+        if numpy.ndim(lambda_) > 0:
+            if return_cov:
+                raise ValueError("The covariance is only computed for a single regularization.")
+            # the outputs are predicted for every distinct regularization
+            mean, std = numpy.empty((X_pred.shape[0], y.shape[1])), numpy.empty((X_pred.shape[0], y.shape[1]))
+            for value in numpy.unique(lambda_):
+                cols = numpy.flatnonzero(lambda_ == value)
+                m2_cols = m2[:, cols] if numpy.ndim(m2) == 2 else m2
+                if return_std:
+                    mean[:, cols], std[:, cols] = self.predict(X, y[:, cols], value, X_pred, True, counts=counts, m2=m2_cols)
+                else:
+                    mean[:, cols] = self.predict(X, y[:, cols], value, X_pred, counts=counts, m2=m2_cols)
+            return (mean, std) if return_std else mean
+        L = self.cholesky(X, lambda_, counts)
+        y_n, y_mean, y_std = normalize(y, counts, m2)
+        weights = self.projections.y if y_n.ndim == 1 else self.projections.y[:, None]
+        V_pred = self.project(X_pred)
+        W_pred = solve_triangular(L, V_pred, lower=True)
+        c = solve_triangular(L, self.projections.X.T @ (weights * y_n), lower=True) / lambda_
+        mean = y_mean + y_std * (W_pred.T @ c)
+        if return_std:
+            var = numpy.clip(1 - numpy.sum(V_pred**2, axis=0) + numpy.sum(W_pred**2, axis=0), 0, None)
+            if y_n.ndim > 1:
+                var = var[:, None]
+            return mean, numpy.sqrt(var) * y_std
+        if return_cov:
+            return mean, self.covariance(X, lambda_, X_pred, counts) * y_std**2
+        return mean
+
+    def covariance(self, X, lambda_, X_pred, counts=None):
+        """Posterior covariance :math:`K_{**} - V_*^T V_* + V_*^T B^{-1} V_*` at locations
+        *X_pred*, for normalized outputs observed at locations *X*.
+
+        :param X: A 2d array of observed locations.
+        :param lambda_: The regularization :math:`\\lambda`.
+        :param X_pred: A 2d array of locations.
+        :param counts: A 1-D array of numbers of observations per location (default: None).
+        :returns: The covariance matrix.
+        """
+        L = self.cholesky(X, lambda_, counts)
+        V_pred = self.project(X_pred)
+        W_pred = solve_triangular(L, V_pred, lower=True)
+        return rbf(X_pred, X_pred, self.bandwidth) - V_pred.T @ V_pred + W_pred.T @ W_pred
+
+
+class KroneckerGrid:
+    """Prior of the RBF kernel on the Cartesian grid spanned by per-parameter *axes*. As the
+    RBF kernel is separable and the grid is a product, the kernel matrix of the grid is the
+    Kronecker product :math:`K_1 \\otimes \\dots \\otimes K_D` of the per-axis kernel matrices.
+    Only the per-axis eigendecompositions :math:`K_d = U_d \\Lambda_d U_d^T` are stored, so
+    that neither the grid nor its covariance are ever materialized.
+
+    Flat grid indices follow the ordering of :func:`numpy.meshgrid` (default `xy` indexing)
+    raveled in C order, as the points of a :class:`space.ParameterSpace`.
+
+    :param axes: A list of 1d arrays of grid values, one per dimension.
+    :param bandwidth: The bandwidth of the RBF kernel.
+    :param chunk_size: The maximal number of elements of temporary arrays (default: 2**22).
+    """
+    def __init__(self, axes, bandwidth, chunk_size=2**22):
+        self.axes = [numpy.asarray(axis, dtype=float) for axis in axes]
+        self.bandwidth = numpy.broadcast_to(numpy.asarray(bandwidth, dtype=float), (len(self.axes),))
+        self.chunk_size = chunk_size
+        self.shape = tuple(len(axis) for axis in self.axes)
+        self.size = int(numpy.prod(self.shape))
+        if len(self.axes) > 1:
+            self.order = [1, 0] + list(range(2, len(self.axes)))
+        else:
+            self.order = [0]
+
+        self.sqrt_factors, self.inv_factors = [], []
+        for axis, bw in zip(self.axes, self.bandwidth):
+            e, U = numpy.linalg.eigh(rbf(axis[:, None], axis[:, None], bw))
+            e = numpy.clip(e, 0, None)
+            inv_sqrt = numpy.zeros_like(e)
+            keep = e > 1e-10 * e.max()
+            inv_sqrt[keep] = 1 / numpy.sqrt(e[keep])
+            self.sqrt_factors.append(U * numpy.sqrt(e))
+            self.inv_factors.append(U * inv_sqrt)
+
+    def ravel(self, tensor):
+        """Flatten a tensor indexed by per-axis indices to the flat grid ordering."""
+        return numpy.transpose(tensor, self.order).ravel()
+
+    def prior_sample(self):
+        """Draw standard normal coefficients defining a sample from the prior on the grid.
+
+        :returns: The coefficients (tensor of shape :attr:`shape`) and the sample on the
+                  grid (tensor of shape :attr:`shape`).
+        """
+        z = numpy.random.standard_normal(self.shape)
+        f = z
+        for d, A in enumerate(self.sqrt_factors):
+            f = numpy.moveaxis(numpy.tensordot(A, f, axes=(1, d)), 0, d)
+        return z, f
+
+    def interpolate(self, z, X):
+        """Evaluate at locations *X* the prior sample defined by the coefficients *z*, i.e.
+        :math:`K_{Xg} K_g^{+} f_g`. This is exact for locations on the grid and the kernel
+        interpolation of the grid sample elsewhere.
+
+        :param z: Coefficients returned by :func:`prior_sample`.
+        :param X: A 2d array of locations.
+        :returns: A 1-D array of sampled values.
+        """
+        X = numpy.asarray(X, dtype=float)
+        B = [rbf(X[:, [d]], axis[:, None], bw) @ P
+             for d, (axis, bw, P) in enumerate(zip(self.axes, self.bandwidth, self.inv_factors))]
+        step = max(1, self.chunk_size * self.shape[0] // self.size)
+        f_X = numpy.empty(X.shape[0])
+        for start in range(0, X.shape[0], step):
+            stop = start + step
+            M = numpy.tensordot(B[0][start:stop], z, axes=(1, 0))
+            for Bd in B[1:]:
+                M = numpy.einsum("ji,ji...->j...", Bd[start:stop], M)
+            f_X[start:stop] = M
+        return f_X
+
+    def cross_dot(self, X, v):
+        """Compute :math:`K_{gX} v` on the whole grid without building :math:`K_{gX}`.
+
+        :param X: A 2d array of locations.
+        :param v: A 1-D array of weights, one per location, or a 2d array with one column
+                  of weights per product to compute.
+        :returns: A tensor of shape :attr:`shape`, with an additional last axis for 2d *v*.
+        """
+        X = numpy.asarray(X, dtype=float)
+        V = numpy.reshape(v, (X.shape[0], -1))
+        C = [rbf(axis[:, None], X[:, [d]], bw) for d, (axis, bw) in enumerate(zip(self.axes, self.bandwidth))]
+        outer_size = self.size // self.shape[-1]
+        step = max(1, self.chunk_size // outer_size)
+        out = numpy.zeros((V.shape[1], outer_size, self.shape[-1]))
+        for start in range(0, X.shape[0], step):
+            stop = start + step
+            for i in range(V.shape[1]):
+                M = V[start:stop, i] * numpy.ones((1, 1))
+                for Cd in C[:-1]:
+                    M = (M[..., None, :] * Cd[:, start:stop]).reshape(-1, M.shape[-1])
+                out[i] += M @ C[-1][:, start:stop].T
+        out = numpy.moveaxis(out.reshape((V.shape[1],) + self.shape), 0, -1)
+        return out if numpy.ndim(v) > 1 else out[..., 0]
+
+
+class FourierFeatures:
+    """Random Fourier features :math:`\\phi(x) = \\sqrt{2/M}\\cos(\\Omega x + b)` of the RBF
+    kernel, such that :math:`\\phi(x)^T\\phi(x') \\approx k(x, x')` [Rahimi2007]_. A function
+    :math:`\\phi(x)^T w` with :math:`w \\sim \\mathcal{N}(0, I)` is an approximate sample
+    from the Gaussian process prior.
+
+    .. [Rahimi2007] Rahimi and Recht (2007). Random features for large-scale kernel machines.
+       *NIPS*
+
+    :param dim: The dimension of the input space.
+    :param bandwidth: The bandwidth of the RBF kernel.
+    :param n_features: The number of features :math:`M`.
+    :param n_functions: The number of prior functions sampled, each with its own weights
+                        :math:`w` (default: 1).
+    """
+    def __init__(self, dim, bandwidth, n_features, n_functions=1):
+        bandwidth = numpy.broadcast_to(numpy.asarray(bandwidth, dtype=float), (dim,))
+        self.omega = numpy.random.standard_normal((n_features, dim)) / bandwidth
+        self.phase = numpy.random.uniform(0, 2 * numpy.pi, n_features)
+        self.weights = numpy.random.standard_normal((n_features, n_functions))
+
+    def features(self, X):
+        """Evaluate the features at locations *X*.
+
+        :param X: A 2d array of locations.
+        :returns: A 2d array of shape (len(*X*), :math:`M`).
+        """
+        M = self.phase.shape[0]
+        return numpy.sqrt(2 / M) * numpy.cos(numpy.asarray(X, dtype=float) @ self.omega.T + self.phase)
+
+    def __call__(self, X):
+        """Evaluate the sampled prior functions :math:`\\phi(x)^T w` at locations *X*
+        (one column per function)."""
+        return self.features(X) @ self.weights
 
 
-def estimate_noise(X, y, bandwidth, s_minus, s_plus, norm_bound, delta):
+def estimate_noise(X, y, bandwidth, s_minus, s_plus, norm_bound, delta, kernel=None, rtol=0, counts=None, m2=0):
     """Given initial lower and upper bounds on the noise standard deviation :math:`\sigma`, this function
     estimates lower and upper bounds on :math:`\sigma` from previous observations
     obtained using streaming kernel regression [Durand2018]_. The estimated bounds define a
-    confidence interval that holds with probability :math:`1-3\delta`. This function relies on the
-    Gaussian process implementation from :mod:`sklearn` with a fixed RBF kernel [Williams2006]_.
+    confidence interval that holds with probability :math:`1-3\delta`. This function relies on
+    kernel regression with a fixed RBF kernel [Williams2006]_ (see :class:`KernelFactor`).
+    The in-sample predictions are obtained from factorizations maintained across calls
+    (see :func:`KernelFactor.in_sample`). The regularizations are rounded with relative
+    precision *rtol* (see :func:`round_regularization`), so that the factorization of a
+    regularization is extended at every call until it drifts by more than *rtol*, instead of
+    being computed again. Repeated observations aggregated at every location
+    (see :class:`AggregatedObservations`) give the same bounds as the repeated observations.
 
     :param X: Input points (2d array).
-    :param y: Observations (1d array)
+    :param y: Observations (1d array), or mean observations with *counts*.
     :param bandwidth: The bandwidth of the RBF kernel.
     :param s_minus: Initial lower bound on :math:`\sigma`.
     :param s_plus: Initial upper bound on :math:`\sigma`.
     :param norm_bound: A bound on the norm of the function in the RKHS induced by the
                        RBF kernel of given `bandwidth`.
     :param delta: The confidence :math:`\delta`.
+    :param kernel: A :class:`KernelFactor` whose factorizations can be reused (default: None).
+    :param rtol: The relative precision of the regularizations (default: 0, not rounded).
+    :param counts: The number of observations at each location of *X* (default: None).
+    :param m2: The sums of squared deviations of the observations at each location (default: 0).
     :returns: Lower and upper bound estimates on :math:`\sigma`.
     """
-    lambda_ = s_plus**2 / norm_bound**2
-    model = GaussianProcessRegressor(RBF(length_scale=bandwidth), alpha=lambda_, optimizer=None, normalize_y=True)
-    model.fit(X, y)
-    y_hat, sqrt_k = model.predict(X, return_std=True)
-    ks = sqrt_k**2
-    s_hat = numpy.sqrt(numpy.mean((y - y_hat)**2))
+    if kernel is None:
+        kernel = KernelFactor(bandwidth)
+    weights = numpy.ones(X.shape[0]) if counts is None else numpy.asarray(counts, dtype=float)
+    lambda_ = round_regularization(s_plus**2 / norm_bound**2, rtol)
+    y_hat, ks = kernel.in_sample(X, y, lambda_, counts, m2)
+    t = numpy.sum(weights)
+    s_hat = numpy.sqrt((numpy.sum(m2) + numpy.sum(weights * (y - y_hat)**2)) / t)
 
-    t = X.shape[0]
     c = numpy.log(numpy.e/delta) * (1 + numpy.log(numpy.pi**2*numpy.log(t)/6) / numpy.log(1/delta))
 
     e = 1 - 1 / numpy.max(1 + ks / lambda_)
@@ -48,13 +1048,10 @@ def estimate_noise(X, y, bandwidth, s_minus, s_plus, norm_bound, delta):
     else:
         s_lb = max(s_lb, s_minus)
 
-    lambda_star = s_lb**2 / norm_bound**2
-    model = GaussianProcessRegressor(RBF(length_scale=bandwidth), alpha=lambda_star, optimizer=None, normalize_y=True)
-    model.fit(X, y)
-    _, sqrt_k = model.predict(X, return_std=True)
-    ks = sqrt_k**2
+    lambda_star = round_regularization(s_lb**2 / norm_bound**2, rtol)
+    _, ks = kernel.in_sample(X, y, lambda_star, counts, m2)
 
-    d = 2 * numpy.log(1/delta) + numpy.sum(numpy.log(1+ks/lambda_star))
+    d = 2 * numpy.log(1/delta) + numpy.sum(weights * numpy.log(1+ks/lambda_star))
     a = max(1 - numpy.sqrt(c/t) - numpy.sqrt((c+2*d)/t), 1e-10)
     b = norm_bound * numpy.sqrt(lambda_*d) / (2 * t)
     s_ub = (numpy.sqrt(b) + numpy.sqrt(b + s_hat * a))**2 / a**2
@@ -66,59 +1063,373 @@ def estimate_noise(X, y, bandwidth, s_minus, s_plus, norm_bound, delta):
     return s_lb, s_ub
 
 
+def reflect_actions(actions, rewards, space_bounds):
+    """Hallucinate pseudo-actions by reflecting the *actions* lying on the boundaries of the
+    space: a coordinate equal to the lower bound :math:`l` is moved to :math:`l - (u - l)` and a
+    coordinate equal to the upper bound :math:`u` is moved to :math:`u + (u - l)`. An action on
+    the boundaries of several dimensions (e.g. a corner) is reflected over every non-empty
+    subset of these dimensions, so that the pseudo-actions around it are symmetric. Each
+    pseudo-action is associated with the reward of the reflected action. Dimensions where
+    :math:`l = u` are never reflected.
+
+    :param actions: A 2d array of locations.
+    :param rewards: A 1-D array of observations.
+    :param space_bounds: A list of tuple (lower, upper) bounds, bounding the input space in
+                         for each dimension.
+    :returns: A 2d array of pseudo-actions and a 1-D array of pseudo-rewards.
+    """
+    actions = numpy.asarray(actions, dtype=float)
+    rewards = numpy.asarray(rewards, dtype=float)
+    lower, upper = numpy.asarray(space_bounds, dtype=float).T
+    on_lower = (actions == lower) & (lower != upper)
+    on_upper = (actions == upper) & (lower != upper)
+    mirrored = numpy.where(on_lower, 2 * lower - upper, numpy.where(on_upper, 2 * upper - lower, actions))
+
+    # bit d of on_bits is set when the action is on a boundary of dimension d
+    dims = numpy.flatnonzero(numpy.any(on_lower | on_upper, axis=0))
+    on_bits = (on_lower | on_upper)[:, dims] @ (1 << numpy.arange(dims.size))
+    pseudo_actions, pseudo_rewards = [], []
+    for subset in range(1, 2**dims.size):
+        rows = (on_bits & subset) == subset
+        if numpy.any(rows):
+            reflected = numpy.zeros(actions.shape[1], dtype=bool)
+            reflected[dims] = (subset >> numpy.arange(dims.size)) & 1
+            pseudo_actions.append(numpy.where(reflected, mirrored[rows], actions[rows]))
+            pseudo_rewards.append(rewards[rows])
+    if not pseudo_actions:
+        return numpy.empty((0, actions.shape[1])), numpy.empty(0)
+    return numpy.concatenate(pseudo_actions), numpy.concatenate(pseudo_rewards)
+
+
 class Kernel_TS:
     """This class relies on kernel regression to generate options to present to the user
-    using a Thompson Sampling approach. It relies on the Gaussian process implementation
-    from :mod:`sklearn` with a fixed RBF kernel [Williams2006]_ and maintain empirical
-    confidence interval on the noise standard deviation :math:`\sigma` [Durand2018]_.
+    using a Thompson Sampling approach. It relies on Gaussian process regression with a
+    fixed RBF kernel [Williams2006]_ and maintain empirical confidence interval on the
+    noise standard deviation :math:`\sigma` [Durand2018]_. The factorization of the kernel
+    matrix is kept in a :class:`KernelFactor` and extended on every :func:`update`.
+
+    Functions can be sampled with one of the following *sampler*:
+
+    * `"dense"`: draw from the posterior covariance over all the sampled points.
+    * `"kronecker"`: exact pathwise sampling over the Cartesian *grid* (see :func:`sample_kronecker`).
+    * `"fourier"`: approximate pathwise sampling using random Fourier features, evaluated
+      on the sampled points in chunks (see :func:`sample_fourier`).
+
+    With *aggregate*, the repeated observations at a location are kept as their count, mean
+    and sum of squared deviations (see :class:`AggregatedObservations`) and the noise
+    variance of the location is divided by its count. The posterior and the noise bounds are
+    the same as with every repeated observation, but the kernel matrix only grows with the
+    number of distinct locations.
 
     :param bandwidth: The bandwidth of the RBF kernel.
     :param s_lb: An initial lower bound on :math:`\sigma`.
     :param s_ub: An initial upper bound on :math:`\sigma`.
+    :param sampler: The sampling method (default: `"dense"`).
+    :param grid: A list of 1d arrays of grid values per dimension, required by the
+                 `"kronecker"` sampler (default: None).
+    :param n_features: The number of random Fourier features of the `"fourier"` sampler
+                       (default: 1000).
+    :param chunk_size: The number of points evaluated at once by the `"fourier"` sampler
+                       (default: 4096).
+    :param kernel: A :class:`KernelFactor` to use, e.g. shared with the models of other
+                   objectives observed at the same locations (default: None, creates one).
+    :param noise_rtol: The relative precision of the regularizations of the noise bounds (see
+                       :func:`round_regularization`), under which their factorizations are
+                       extended instead of computed again (default: 0.1).
+    :param aggregate: If True, aggregate the repeated observations at every location (default: False).
     """
-    def __init__(self, bandwidth, s_lb, s_ub):
+    def __init__(self, bandwidth, s_lb, s_ub, sampler="dense", grid=None, n_features=1000, chunk_size=4096,
+                 kernel=None, noise_rtol=0.1, aggregate=False):
         self.bandwidth = bandwidth
         self.s_lb = s_lb
         self.s_ub = s_ub
-        self.X = None
-        self.y = None
+        self.noise_rtol = noise_rtol
+        self.aggregate = aggregate
+        self.observations = AggregatedObservations() if aggregate else ObservationBuffer()
+        self.kernel = KernelFactor(bandwidth) if kernel is None else kernel
+
+        self.sampler = sampler
+        self.n_features = n_features
+        self.chunk_size = chunk_size
+        if sampler == "kronecker":
+            self.grid = KroneckerGrid(grid, bandwidth)
+        elif sampler not in ["dense", "fourier"]:
+            raise ValueError("Unknown sampler {}".format(sampler))
 
         norm_bound = 5
-        self.lambda_ = s_ub**2/norm_bound**2
+        self.lambda_ = round_regularization(s_ub**2/norm_bound**2, noise_rtol)
+
+    @property
+    def X(self):
+        """A view of the observed locations (2d array), or None before the first update."""
+        return self.observations.X
+
+    @property
+    def y(self):
+        """A view of the observations (1-D array), or of their means with *aggregate*, or
+        None before the first update."""
+        return self.observations.y
+
+    @property
+    def counts(self):
+        """A view of the number of observations at each location (1-D array) with
+        *aggregate*, or None."""
+        return self.observations.counts if self.aggregate else None
+
+    @property
+    def m2(self):
+        """A view of the sums of squared deviations of the observations at each location
+        (1-D array) with *aggregate*, or 0."""
+        return self.observations.m2 if self.aggregate else 0
+
+    def regression_data(self):
+        """Return the kernel factorization, the locations and the observations on which
+        the regression model is fitted.
+
+        :returns: A :class:`KernelFactor`, a 2d array of locations (or None) and a 1-D
+                  array of observations (or None).
+        """
+        return self.kernel, self.X, self.y
+
+    def regression_weights(self):
+        """Return the statistics of the repeated observations at the locations of
+        :func:`regression_data`.
+
+        :returns: A 1-D array of numbers of observations (or None without *aggregate*) and
+                  a 1-D array of sums of squared deviations (or 0 without *aggregate*).
+        """
+        return self.counts, self.m2
+
+    def noise_bounds(self, n_outputs, s_ub=None, lambda_=None):
+        """Return the upper bounds on :math:`\\sigma` and the regularizations of several outputs
+        sharing the locations of this model, and the scales :math:`\\sigma / \\sqrt{\\lambda}`
+        of their prior.
+
+        :param n_outputs: The number of outputs.
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default:
+                     None, the upper bound of this model).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None, the
+                        regularization of this model).
+        :returns: Three 1-D arrays, one value per output.
+        """
+        s_ub = numpy.broadcast_to(self.s_ub if s_ub is None else s_ub, n_outputs).astype(float)
+        lambda_ = numpy.broadcast_to(self.lambda_ if lambda_ is None else lambda_, n_outputs).astype(float)
+        return s_ub, lambda_, s_ub / numpy.sqrt(lambda_)
+
+    def state(self):
+        """Return the state of the model, i.e. its observations and noise bounds, to be
+        saved (see :func:`load_state`). The kernel factorizations are saved separately
+        (see :func:`Kernel_TS_MultiObjective.state`).
+
+        :returns: A dict of metadata and a dict of arrays.
+        """
+        meta = {"class": type(self).__name__, "aggregate": self.aggregate}
+        for key in ["s_lb", "s_ub", "lambda_", "lambda_star"]:
+            if hasattr(self, key):
+                meta[key] = float(getattr(self, key))
+        arrays = {"X": self.X, "y": self.y} if self.X is not None else {}
+        if self.aggregate and self.X is not None:
+            arrays["counts"], arrays["m2"] = self.counts, self.m2
+        return meta, arrays
+
+    def load_state(self, meta, arrays):
+        """Restore a state returned by :func:`state`.
+
+        :param meta: A dict of metadata.
+        :param arrays: A dict of arrays (e.g. memory-mapped).
+        """
+        if meta.get("aggregate", False) != self.aggregate:
+            raise ValueError("The state was saved with aggregate={}.".format(meta.get("aggregate", False)))
+        for key in ["s_lb", "s_ub", "lambda_", "lambda_star"]:
+            if key in meta:
+                setattr(self, key, meta[key])
+        if self.aggregate:
+            self.observations.load(arrays.get("X"), arrays.get("y"), arrays.get("counts"), arrays.get("m2"))
+        else:
+            self.observations.load(arrays.get("X"), arrays.get("y"))
 
     def predict(self, X_pred):
         """Predict mean and standard deviation at given points *X_pred*.
 
-        :param X_pred: A 2d array of locations at which to predict.
+        :param X_pred: A 2d array of locations, or a :class:`space.ParameterSpace`, at which
+                       to predict.
         :returns: An array of means and an array of standard deviations.
         """
-        if self.X is not None:
-            gp = GaussianProcessRegressor(RBF(length_scale=self.bandwidth), alpha=self.lambda_, optimizer=None, normalize_y=True)
-            gp.fit(self.X, self.y)
-            mean, sqrt_k = gp.predict(X_pred, return_std=True)
-            std = self.s_ub / numpy.sqrt(self.lambda_) * sqrt_k
+        kernel, X, y = self.regression_data()
+        counts, m2 = self.regression_weights()
+        if X is not None:
+            mean, std = self.predict_batch(X_pred, y[:, None], numpy.reshape(m2, (-1, 1)))
+            mean, std = mean[0], std[0]
         else:
             mean = numpy.full(X_pred.shape[0], 0)
             std = numpy.full(X_pred.shape[0], self.s_ub / numpy.sqrt(self.lambda_))
         return mean, std
 
+    def predict_batch(self, X_pred, Y, M2=0, s_ub=None, lambda_=None):
+        """Predict means and standard deviations at given points *X_pred* for several
+        observation vectors *Y* sharing the locations of this model, and by default its
+        noise bounds.
+
+        :param X_pred: A 2d array of locations at which to predict.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0, see :func:`regression_weights`).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: 2d arrays of means and of standard deviations, one row per output.
+        """
+        kernel, X, _ = self.regression_data()
+        counts, _ = self.regression_weights()
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        mean, sqrt_k = kernel.predict(X, Y, lambda_, X_pred, return_std=True, counts=counts, m2=M2)
+        std = scale * sqrt_k
+        return mean.T, std.T
+
     def sample(self, X_sample):
         """Sample a function evaluated at points *X_sample*.
 
-        :param X_sample: A 2d array locations at which to evaluate the sampled function.
+        :param X_sample: A 2d array locations, or a :class:`space.ParameterSpace`, at which
+                         to evaluate the sampled function.
         :returns: A 1-D of the pointwise evaluation of a sampled function.
         """
-        if self.X is not None:
-            gp = GaussianProcessRegressor(RBF(length_scale=self.bandwidth), alpha=self.lambda_,
-                                              optimizer=None, normalize_y=True)
-            gp.fit(self.X, self.y)
-            mean, k = gp.predict(X_sample, return_cov=True)
-            cov = self.s_ub**2 / self.lambda_ * k
-        else:
-            mean= numpy.full(X_sample.shape[0], 0)
-            cov = self.s_ub**2 / self.lambda_ * numpy.identity(X_sample.shape[0])
-        f_tilde = numpy.random.multivariate_normal(mean, cov, 1)[0]
-        return f_tilde
+        kernel, X, y = self.regression_data()
+        counts, m2 = self.regression_weights()
+        if X is None:
+            return numpy.random.normal(0, self.s_ub / numpy.sqrt(self.lambda_), X_sample.shape[0])
+        return self.sample_batch(X_sample, y[:, None], numpy.reshape(m2, (-1, 1)))[0]
+
+    def sample_batch(self, X_sample, Y, M2=0, s_ub=None, lambda_=None):
+        """Sample one function for each of several observation vectors *Y* sharing the
+        locations of this model, and by default its noise bounds, using the sampler of this
+        model.
+
+        :param X_sample: A 2d array locations, or a :class:`space.ParameterSpace`, at which
+                         to evaluate the sampled functions.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0, see :func:`regression_weights`).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of the pointwise evaluations, one row per output.
+        """
+        if self.sampler == "kronecker":
+            return self.sample_kronecker(X_sample, Y, M2, s_ub, lambda_)
+        elif self.sampler == "fourier":
+            return self.sample_fourier(X_sample, Y, M2, s_ub, lambda_)
+        return self.sample_dense(X_sample, Y, M2, s_ub, lambda_)
+
+    def sample_dense(self, X_sample, Y, M2=0, s_ub=None, lambda_=None):
+        """Sample functions from the posterior covariance over all the points *X_sample*.
+        The covariance, and its decomposition, are shared by all the outputs with the same
+        regularization.
+
+        :param X_sample: A 2d array locations, or a :class:`space.ParameterSpace`, at which
+                         to evaluate the sampled functions.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of the pointwise evaluations, one row per output.
+        """
+        kernel, X, _ = self.regression_data()
+        counts, _ = self.regression_weights()
+        X_sample = numpy.asarray(X_sample, dtype=float)
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        _, y_mean, y_std = normalize(Y, counts, M2)
+        mean = kernel.predict(X, Y, lambda_, X_sample, counts=counts, m2=M2)
+        z = numpy.empty((Y.shape[1], X_sample.shape[0]))
+        for value in numpy.unique(lambda_):
+            cols = numpy.flatnonzero(lambda_ == value)
+            cov = kernel.covariance(X, value, X_sample, counts)
+            z[cols] = scale[cols, None] * numpy.random.multivariate_normal(numpy.zeros(X_sample.shape[0]), cov, cols.size)
+        return mean.T + y_std[:, None] * z
+
+    def sample_kronecker(self, X_sample, Y, M2=0, s_ub=None, lambda_=None):
+        """Sample functions evaluated on the whole grid using Matheron's rule
+
+        .. math::
+            \\tilde{f}_g = \\mu_g + f_g - K_{gX}(K + \\lambda I)^{-1}(f_X + \\epsilon),
+
+        where :math:`f` is a prior sample drawn through :class:`KroneckerGrid` and
+        :math:`\\epsilon \\sim \\mathcal{N}(0, \\lambda I)` (:math:`\\lambda N^{-1}` for aggregated observations). Samples are exact for observations
+        on the grid and the covariance over the grid is never materialized: the cost is
+        :math:`O(|g| (N + \\sum_d n_d))` and the memory :math:`O(|g|)`.
+
+        :param X_sample: The :class:`space.ParameterSpace` of the *grid* given at initialization,
+                         or a 2d array of its locations.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of the pointwise evaluations, one row per output.
+        """
+        if X_sample.shape[0] != self.grid.size:
+            raise ValueError("The kronecker sampler can only sample on its whole grid.")
+        kernel, X, _ = self.regression_data()
+        counts, _ = self.regression_weights()
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        noise = lambda_ if counts is None else lambda_ / numpy.reshape(counts, (-1, 1))
+        y_n, y_mean, y_std = normalize(Y, counts, M2)
+        priors = [self.grid.prior_sample() for _ in range(Y.shape[1])]
+        F_X = numpy.array([self.grid.interpolate(z, X) for z, _ in priors]).T
+        F_X += numpy.random.normal(0, numpy.sqrt(noise), F_X.shape)
+        weights = kernel.solve(X, numpy.r_[lambda_, lambda_], numpy.c_[y_n, F_X], counts)
+        weights = weights[:, :Y.shape[1]] - scale * weights[:, Y.shape[1]:]
+        corrections = self.grid.cross_dot(X, weights)
+        f_tilde = [self.grid.ravel(scale[i] * f + corrections[..., i]) for i, (_, f) in enumerate(priors)]
+        return y_mean[:, None] + y_std[:, None] * numpy.array(f_tilde)
+
+    def sample_fourier(self, X_sample, Y, M2=0, s_ub=None, lambda_=None):
+        """Sample functions evaluated at points *X_sample* using Matheron's rule
+
+        .. math::
+            \\tilde{f}(x) = \\mu(x) + f(x) - k(x, X)(K + \\lambda I)^{-1}(f_X + \\epsilon),
+
+        where the prior sample :math:`f` is approximated with :class:`FourierFeatures` and
+        :math:`\\epsilon \\sim \\mathcal{N}(0, \\lambda I)` (:math:`\\lambda N^{-1}` for aggregated observations). The sampled functions are evaluated on
+        chunks of :attr:`chunk_size` points, so that the cost is linear in the number of
+        points and the memory is bounded by the chunk size.
+
+        :param X_sample: A 2d array locations, or a :class:`space.ParameterSpace`, at which
+                         to evaluate the sampled functions.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of the pointwise evaluations, one row per output.
+        """
+        kernel, X, _ = self.regression_data()
+        counts, _ = self.regression_weights()
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        noise = lambda_ if counts is None else lambda_ / numpy.reshape(counts, (-1, 1))
+        y_n, y_mean, y_std = normalize(Y, counts, M2)
+        prior = FourierFeatures(X.shape[1], self.bandwidth, self.n_features, Y.shape[1])
+        F_X = prior(X) + numpy.random.normal(0, numpy.sqrt(noise), (X.shape[0], Y.shape[1]))
+        weights = kernel.solve(X, numpy.r_[lambda_, lambda_], numpy.c_[y_n, F_X], counts)
+        weights = weights[:, :Y.shape[1]] - scale * weights[:, Y.shape[1]:]
+        f_tilde = numpy.empty((X_sample.shape[0], Y.shape[1]))
+        for start in range(0, X_sample.shape[0], self.chunk_size):
+            chunk = X_sample[start:start + self.chunk_size]
+            f_tilde[start:start + self.chunk_size] = scale * prior(chunk) + rbf(chunk, X, self.bandwidth) @ weights
+        return (y_mean + y_std * f_tilde).T
+
+    def append(self, action, reward, *args):
+        """Append the observations *reward* acquired at location *action* to the kernel
+        regression model, keeping the current noise bounds (see :func:`update`).
+
+        :param action: A 2d array of locations.
+        :param reward: A 1-D array of observations.
+        :param `*args`: Dummy parameter to handle functions of inheritated classes.
+        """
+        self.observations.append(action, reward)
 
     def update(self, action, reward, *args):
         """Update the kernel regression model using the observations *reward* acquired at
@@ -127,28 +1438,24 @@ class Kernel_TS:
         
         :param action: A 2d array of locations.
         :param reward: A 1-D array of observations.
-        :param `*args`: Dummy parameter to handle functions of inheritated classes.
+        :param `*args`: Additional parameters given to :func:`append`.
         """
-        if self.X is None:
-            self.X = numpy.asarray(action)
-            self.y = numpy.asarray(reward)
-        else:
-            self.X = numpy.r_[self.X, action]
-            self.y = numpy.r_[self.y, reward]
+        self.append(action, reward, *args)
 
         norm_bound = 5
         delta = 0.1
         s_lb, s_ub = estimate_noise(self.X, self.y, self.bandwidth, self.s_lb, self.s_ub,
-                                    norm_bound, delta)
-        lambda_, lambda_star = s_ub**2/norm_bound**2, s_lb**2/norm_bound**2
+                                    norm_bound, delta, self.kernel, self.noise_rtol, self.counts, self.m2)
+        lambda_ = round_regularization(s_ub**2/norm_bound**2, self.noise_rtol)
+        lambda_star = round_regularization(s_lb**2/norm_bound**2, self.noise_rtol)
         self.s_lb, self.s_ub, self.lambda_, self.lambda_star = s_lb, s_ub, lambda_, lambda_star
 
 
 class Kernel_TS_PseudoActions(Kernel_TS):
     """This class relies on kernel regression to generate options to present to the user
-    using a Thompson Sampling approach. It relies on the Gaussian process implementation
-    from :mod:`sklearn` with a fixed RBF kernel [Williams2006]_ and maintain empirical
-    confidence interval on the noise standard deviation :math:`\sigma` [Durand2018]_.
+    using a Thompson Sampling approach. It relies on Gaussian process regression with a
+    fixed RBF kernel [Williams2006]_ and maintain empirical confidence interval on the
+    noise standard deviation :math:`\sigma` [Durand2018]_.
     It extends the class :class:`Kernel_TS` to hallucinate pseudo-actions (and associated
     pseudo-rewards). Pseudo-actions are reflected at over the boundaries of the space and
     
@@ -158,53 +1465,106 @@ class Kernel_TS_PseudoActions(Kernel_TS):
     :param s_ub: An initial upper bound on :math:`\sigma`.
     :param space_bounds: A list of tuple (lower, upper) bounds, bounding the input space in
                          for each dimension.
+    :param pseudo_kernel: A :class:`KernelFactor` to use for the pseudo-actions (default: None,
+                          creates one).
+    :param `**kwargs`: This method also takes the keyword arguments of :class:`Kernel_TS`.
     """
-    def __init__(self, bandwidth, s_lb, s_ub, space_bounds):
-        super().__init__(bandwidth, s_lb, s_ub)
+    def __init__(self, bandwidth, s_lb, s_ub, space_bounds, pseudo_kernel=None, **kwargs):
+        super().__init__(bandwidth, s_lb, s_ub, **kwargs)
 
         self.space_bounds = space_bounds
-        self.pseudo_X = None
-        self.pseudo_y = None
+        self.pseudo_observations = AggregatedObservations() if self.aggregate else ObservationBuffer()
+        self.pseudo_kernel = KernelFactor(bandwidth) if pseudo_kernel is None else pseudo_kernel
 
-    def predict(self, X_pred):
-        """Predict mean and standard deviation at given points *X_pred*.
+    @property
+    def pseudo_X(self):
+        """A view of the observed locations and pseudo-actions (2d array), or None."""
+        return self.pseudo_observations.X
 
-        :param X_pred: A 2d array of locations at which to predict.
-        :returns: An array of means and an array of standard deviations.
+    @property
+    def pseudo_y(self):
+        """A view of the observations and pseudo-rewards (1-D array), or None."""
+        return self.pseudo_observations.y
+
+    @property
+    def pseudo_counts(self):
+        """A view of the number of observations and pseudo-rewards at each location (1-D
+        array) with *aggregate*, or None."""
+        return self.pseudo_observations.counts if self.aggregate else None
+
+    @property
+    def pseudo_m2(self):
+        """A view of the sums of squared deviations of the observations and pseudo-rewards
+        at each location (1-D array) with *aggregate*, or 0."""
+        return self.pseudo_observations.m2 if self.aggregate else 0
+
+    def regression_data(self):
+        """Return the kernel factorization, the locations and the observations (including
+        pseudo-actions and pseudo-rewards) on which the regression model is fitted.
+
+        :returns: A :class:`KernelFactor`, a 2d array of locations (or None) and a 1-D
+                  array of observations (or None).
         """
-        if self.pseudo_X is not None:
-            gp = GaussianProcessRegressor(RBF(length_scale=self.bandwidth), alpha=self.lambda_,
-                                              optimizer=None, normalize_y=True)
-            gp.fit(self.pseudo_X, self.pseudo_y)
-            mean, sqrt_k = gp.predict(X_pred, return_std=True)
-            std = self.s_ub / numpy.sqrt(self.lambda_) * sqrt_k
-        else:
-            mean = numpy.full(X_pred.shape[0], 0)
-            std = numpy.full(X_pred.shape[0], self.s_ub / numpy.sqrt(self.lambda_))
-        return mean, std
+        return self.pseudo_kernel, self.pseudo_X, self.pseudo_y
 
-    def sample(self, X_sample):
-        """Sample a function evaluated at points *X_sample*.
+    def regression_weights(self):
+        """Return the statistics of the repeated observations and pseudo-rewards at the
+        locations of :func:`regression_data` (see :func:`Kernel_TS.regression_weights`).
 
-        :param X_sample: A 2d array locations at which to evaluate the sampled function.
-        :returns: A 1-D of the pointwise evaluation of a sampled function.
+        :returns: A 1-D array of numbers of observations (or None) and a 1-D array of sums
+                  of squared deviations (or 0).
+        """
+        return self.pseudo_counts, self.pseudo_m2
+
+    def state(self):
+        """Return the state of the model, including the pseudo-actions (see :func:`Kernel_TS.state`).
+
+        :returns: A dict of metadata and a dict of arrays.
         """
+        meta, arrays = super().state()
         if self.pseudo_X is not None:
-            gp = GaussianProcessRegressor(RBF(length_scale=self.bandwidth), alpha=self.lambda_,
-                                              optimizer=None, normalize_y=True)
-            gp.fit(self.pseudo_X, self.pseudo_y)
-            mean, k = gp.predict(X_sample, return_cov=True)
-            cov = self.s_ub**2 / self.lambda_ * k
+            arrays["pseudo_X"], arrays["pseudo_y"] = self.pseudo_X, self.pseudo_y
+        if self.aggregate and self.pseudo_X is not None:
+            arrays["pseudo_counts"], arrays["pseudo_m2"] = self.pseudo_counts, self.pseudo_m2
+        return meta, arrays
+
+    def load_state(self, meta, arrays):
+        """Restore a state returned by :func:`state`.
+
+        :param meta: A dict of metadata.
+        :param arrays: A dict of arrays (e.g. memory-mapped).
+        """
+        super().load_state(meta, arrays)
+        if self.aggregate:
+            self.pseudo_observations.load(arrays.get("pseudo_X"), arrays.get("pseudo_y"),
+                                          arrays.get("pseudo_counts"), arrays.get("pseudo_m2"))
         else:
-            mean= numpy.full(X_sample.shape[0], 0)
-            cov = self.s_ub**2 / self.lambda_ * numpy.identity(X_sample.shape[0])
-        f_tilde = numpy.random.multivariate_normal(mean, cov, 1)[0]
-        return f_tilde
+            self.pseudo_observations.load(arrays.get("pseudo_X"), arrays.get("pseudo_y"))
+
+    def append(self, actions, rewards, space_bounds=None):
+        """Append the observations *rewards* acquired at locations *actions*, and the
+        associated pseudo-actions, to the kernel regression model, keeping the current
+        noise bounds (see :func:`update`).
+
+        :param actions: A 2d array of locations.
+        :param rewards: A 1-D array of observations.
+        :param space_bounds: A list of tuple (lower, upper) bounds, bounding the input space in
+                             for each dimension (default: None). If None, uses the object attribute
+                             :attr:`space_bounds`.
+        """
+        actions, rewards = numpy.asarray(actions, dtype=float), numpy.asarray(rewards, dtype=float)
+        # add pseudo rewards
+        if space_bounds is None: space_bounds = self.space_bounds
+        pseudo_actions, pseudo_rewards = reflect_actions(actions, rewards, space_bounds)
+
+        self.observations.append(actions, rewards)
+        self.pseudo_observations.append(numpy.r_[actions, pseudo_actions], numpy.r_[rewards, pseudo_rewards])
 
     def update(self, actions, rewards, space_bounds=None):
         """Update the kernel regression model using the observations *reward* acquired at
-        location *action*. Estimate upper and lower bounds on the noise variance using
-        :func:`estimate_noise` with confidence :math:`\delta=0.1`.
+        location *action*, and the associated pseudo-actions (see :func:`append`). Estimate
+        upper and lower bounds on the noise variance using :func:`estimate_noise` with
+        confidence :math:`\delta=0.1`.
         
         :param action: A 2d array of locations.
         :param reward: A 1-D array of observations.
@@ -212,35 +1572,355 @@ class Kernel_TS_PseudoActions(Kernel_TS):
                              for each dimension (default: None). If None, uses the object attribute
                              :attr:`space_bounds`.
         """
-        if self.X is None:
-            self.X = numpy.asarray(actions)
-            self.y = numpy.asarray(rewards)
-            self.pseudo_X = numpy.asarray(actions)
-            self.pseudo_y = numpy.asarray(rewards)
-        else:
-            self.X = numpy.r_[self.X, actions]
-            self.y = numpy.r_[self.y, rewards]
-            self.pseudo_X = numpy.r_[self.pseudo_X, actions]
-            self.pseudo_y = numpy.r_[self.pseudo_y, rewards]
+        super().update(actions, rewards, space_bounds)
 
-        # add pseudo rewards
-        if space_bounds is None: space_bounds = self.space_bounds
-        for a, r in zip(actions, rewards):
-            for i, (l, u) in enumerate(space_bounds):
-                if a[i] == l:
-                    pseudo_a = numpy.copy(a)
-                    pseudo_a[i] = l - (u - l)
-                    self.pseudo_X = numpy.r_[self.pseudo_X, [pseudo_a]]
-                    self.pseudo_y = numpy.r_[self.pseudo_y, r]
-                elif a[i] == u:
-                    pseudo_a = numpy.copy(a)
-                    pseudo_a[i] = u + (u - l)
-                    self.pseudo_X = numpy.r_[self.pseudo_X, [pseudo_a]]
-                    self.pseudo_y = numpy.r_[self.pseudo_y, r]
 
-        norm_bound = 5
-        delta = 0.1
-        s_lb, s_ub = estimate_noise(self.X, self.y, self.bandwidth, self.s_lb, self.s_ub,
-                                    norm_bound, delta)
-        lambda_, lambda_star = s_ub**2/norm_bound**2, s_lb**2/norm_bound**2
-        self.s_lb, self.s_ub, self.lambda_, self.lambda_star = s_lb, s_ub, lambda_, lambda_star
+class Kernel_TS_Sparse(Kernel_TS):
+    """This class relies on sparse kernel regression to generate options to present to the
+    user using a Thompson Sampling approach. It has the same interface as :class:`Kernel_TS`,
+    but its regression model is approximated through inducing points (see
+    :class:`SparseKernelFactor`), so that an update costs :math:`O(NM^2)` for :math:`N`
+    observations and :math:`M` inducing points. This allows to keep long optimization
+    histories, e.g. merged from many previous optimizations.
+
+    The `"kronecker"` and `"fourier"` samplers draw a prior function :math:`f` and condition it
+    on sampled inducing values (see :func:`sample_kronecker` and :func:`sample_fourier`). The
+    `"dense"` sampler draws from the approximate posterior covariance.
+
+    :param bandwidth: The bandwidth of the RBF kernel.
+    :param s_lb: An initial lower bound on :math:`\sigma`.
+    :param s_ub: An initial upper bound on :math:`\sigma`.
+    :param inducing: A 2d array of inducing points (see :func:`inducing_grid`), ignored when
+                     *kernel* is given (default: None).
+    :param kernel: A :class:`SparseKernelFactor` to use, e.g. shared with the models of other
+                   objectives observed at the same locations (default: None, creates one).
+    :param `**kwargs`: This method also takes the keyword arguments of :class:`Kernel_TS`.
+    """
+    def __init__(self, bandwidth, s_lb, s_ub, inducing=None, kernel=None, **kwargs):
+        if kernel is None:
+            kernel = SparseKernelFactor(bandwidth, inducing)
+        super().__init__(bandwidth, s_lb, s_ub, kernel=kernel, **kwargs)
+
+    def inducing_weights(self, Y, F_Z, M2=0, s_ub=None, lambda_=None):
+        """Weights :math:`w` such that the sampled functions are
+        :math:`\\tilde{f}(x) = \\mu(x) + f(x) + V_x^T w`, where :math:`V_x` is the projection of
+        :math:`x` on the inducing points (see :func:`SparseKernelFactor.project`). The weights
+        combine the posterior mean of the whitened inducing values, a sample of their posterior
+        deviation and the removal of the prior sample at the inducing points :math:`f_Z`.
+
+        :param Y: A 2d array of observations, one column per output.
+        :param F_Z: A 2d array of the prior samples at the inducing points, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`Kernel_TS.noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of weights, one column per output.
+        """
+        kernel, X, _ = self.regression_data()
+        counts, _ = self.regression_weights()
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        y_n, y_mean, y_std = normalize(Y, counts, M2)
+        kernel.sync(X, counts)
+        projected = kernel.projections.X.T @ (kernel.projections.y[:, None] * y_n)
+        prior = solve_triangular(kernel.L_Z, F_Z, lower=True)
+        weights = numpy.empty(F_Z.shape)
+        for value in numpy.unique(lambda_):
+            # the M x M factorization is computed for every distinct regularization
+            cols = numpy.flatnonzero(lambda_ == value)
+            L = kernel.cholesky(X, value, counts)
+            mean = cho_solve((L, True), projected[:, cols]) / value
+            deviation = solve_triangular(L, numpy.random.standard_normal((F_Z.shape[0], cols.size)), lower=True, trans="T")
+            weights[:, cols] = mean + scale[cols] * (deviation - prior[:, cols])
+        return weights
+
+    def sample_kronecker(self, X_sample, Y, M2=0, s_ub=None, lambda_=None):
+        """Sample functions evaluated on the whole grid. The prior functions are drawn
+        through :class:`KroneckerGrid` and conditioned on the inducing values (see
+        :func:`inducing_weights`), which must be on the grid. The cost is
+        :math:`O(|g| (M + \\sum_d n_d))`.
+
+        :param X_sample: The :class:`space.ParameterSpace` of the *grid* given at initialization,
+                         or a 2d array of its locations.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`Kernel_TS.noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of the pointwise evaluations, one row per output.
+        """
+        if X_sample.shape[0] != self.grid.size:
+            raise ValueError("The kronecker sampler can only sample on its whole grid.")
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        _, y_mean, y_std = normalize(Y, self.regression_weights()[0], M2)
+        priors = [self.grid.prior_sample() for _ in range(Y.shape[1])]
+        F_Z = numpy.array([self.grid.interpolate(z, self.kernel.inducing) for z, _ in priors]).T
+        weights = self.inducing_weights(Y, F_Z, M2, s_ub, lambda_)
+        f_tilde = scale[:, None] * numpy.array([self.grid.ravel(f) for _, f in priors])
+        for start in range(0, X_sample.shape[0], self.chunk_size):
+            V = self.kernel.project(X_sample[start:start + self.chunk_size])
+            f_tilde[:, start:start + self.chunk_size] += (V.T @ weights).T
+        return y_mean[:, None] + y_std[:, None] * f_tilde
+
+    def sample_fourier(self, X_sample, Y, M2=0, s_ub=None, lambda_=None):
+        """Sample functions evaluated at points *X_sample*. The prior functions are
+        approximated with :class:`FourierFeatures` and conditioned on the inducing values (see
+        :func:`inducing_weights`). The sampled functions are evaluated on chunks of
+        :attr:`chunk_size` points.
+
+        :param X_sample: A 2d array locations, or a :class:`space.ParameterSpace`, at which
+                         to evaluate the sampled functions.
+        :param Y: A 2d array of observations, one column per output.
+        :param M2: A 2d array of sums of squared deviations of the aggregated observations,
+                   one column per output (default: 0).
+        :param s_ub: A 1-D array of upper bounds on :math:`\\sigma`, one per output (default: None,
+                     see :func:`Kernel_TS.noise_bounds`).
+        :param lambda_: A 1-D array of regularizations, one per output (default: None).
+        :returns: A 2d array of the pointwise evaluations, one row per output.
+        """
+        s_ub, lambda_, scale = self.noise_bounds(Y.shape[1], s_ub, lambda_)
+        _, y_mean, y_std = normalize(Y, self.regression_weights()[0], M2)
+        prior = FourierFeatures(X_sample.shape[1], self.bandwidth, self.n_features, Y.shape[1])
+        weights = self.inducing_weights(Y, prior(self.kernel.inducing), M2, s_ub, lambda_)
+        f_tilde = numpy.empty((X_sample.shape[0], Y.shape[1]))
+        for start in range(0, X_sample.shape[0], self.chunk_size):
+            chunk = X_sample[start:start + self.chunk_size]
+            f_tilde[start:start + self.chunk_size] = scale * prior(chunk) + self.kernel.project(chunk).T @ weights
+        return (y_mean + y_std * f_tilde).T
+
+
+class Kernel_TS_MultiObjective:
+    """This class serves the models of several objectives that are all updated at the same
+    locations, for instance the :class:`Kernel_TS` of every objective of an optimization.
+    When the models share the same :class:`KernelFactor` (see parameter *kernel* of
+    :class:`Kernel_TS`), they are predicted and sampled in one batched call (see
+    :func:`Kernel_TS.predict_batch` and :func:`Kernel_TS.sample_batch`), whatever their
+    regularizations. Every distinct regularization is served by its persistent Cholesky
+    factor (see :func:`KernelFactor.cholesky`), and the kernel vectors of the sampled points
+    are computed once for every objective. The noise bounds of each objective
+    are still applied on top of the shared model, and still estimated separately (see
+    :func:`estimate_noise`). With the `"dense"` sampler, the posterior covariance is
+    decomposed for every distinct regularization.
+
+    :param algos: A list of :class:`Kernel_TS`, one per objective.
+    """
+    def __init__(self, algos):
+        self.algos = algos
+
+    def groups(self):
+        """Group the models that can be predicted and sampled together, i.e. that share
+        the same kernel factorization, locations, counts and sampler.
+
+        :returns: A list of lists of indices in :attr:`algos`.
+        """
+        groups = []
+        for i, algo in enumerate(self.algos):
+            kernel, X, _ = algo.regression_data()
+            for group in groups:
+                ref = self.algos[group[0]]
+                ref_kernel, ref_X, _ = ref.regression_data()
+                if (kernel is ref_kernel and X is not None and ref_X is not None and
+                        algo.sampler == ref.sampler and
+                        numpy.array_equal(X, ref_X) and
+                        numpy.array_equal(algo.regression_weights()[0], ref.regression_weights()[0])):
+                    group.append(i)
+                    break
+            else:
+                groups.append([i])
+        return groups
+
+    def batch(self, group):
+        """Stack the observations and the noise bounds of a group of models (see :func:`groups`).
+
+        :param group: A list of indices in :attr:`algos`.
+        :returns: The 2d arrays of observations and of sums of squared deviations, one column
+                  per model, and the 1-D arrays of upper bounds on :math:`\\sigma` and of
+                  regularizations, one value per model.
+        """
+        algos = [self.algos[i] for i in group]
+        Y = numpy.array([algo.regression_data()[2] for algo in algos]).T
+        M2 = numpy.array([algo.regression_weights()[1] for algo in algos]).T
+        return Y, M2, numpy.array([algo.s_ub for algo in algos]), numpy.array([algo.lambda_ for algo in algos])
+
+    def predict(self, X_pred):
+        """Predict means and standard deviations of every objective at given points *X_pred*.
+
+        :param X_pred: A 2d array of locations at which to predict.
+        :returns: 2d arrays of means and of standard deviations, one row per objective.
+        """
+        means = numpy.empty((len(self.algos), X_pred.shape[0]))
+        stds = numpy.empty((len(self.algos), X_pred.shape[0]))
+        for group in self.groups():
+            algo = self.algos[group[0]]
+            if algo.regression_data()[1] is None:
+                means[group[0]], stds[group[0]] = algo.predict(X_pred)
+            else:
+                Y, M2, s_ub, lambda_ = self.batch(group)
+                means[group], stds[group] = algo.predict_batch(X_pred, Y, M2, s_ub, lambda_)
+        return means, stds
+
+    def information_gain(self, X_pred, chunk_size=None):
+        """Information gained on the objectives by observing them at given points *X_pred*,
+        i.e. the sum over objectives of the mutual information
+        :math:`\\frac{1}{2}\\log(1 + \\sigma^2_t(x) / \\sigma^2)` between an observation and the
+        objective, given the posterior variance :math:`\\sigma^2_t(x)` and the noise upper
+        bound :math:`\\sigma` of every model. The points are predicted in chunks, so that the
+        kernel vectors of only *chunk_size* points are kept in memory at once.
+
+        :param X_pred: A 2d array of locations.
+        :param chunk_size: The number of points predicted at once (default: None, the
+                           *chunk_size* of the first model).
+        :returns: A 1-D array of information gains (nats).
+        """
+        if chunk_size is None:
+            chunk_size = self.algos[0].chunk_size
+        scales = []
+        for algo in self.algos:
+            _, X, y = algo.regression_data()
+            if X is None:
+                scales.append(1.0)
+            else:
+                # the standard deviations are scaled by the normalization of the observations
+                counts, m2 = algo.regression_weights()
+                scales.append(normalize(y, counts, m2)[2])
+        gains = numpy.zeros(X_pred.shape[0])
+        for start in range(0, X_pred.shape[0], chunk_size):
+            _, stds = self.predict(X_pred[start:start + chunk_size])
+            for algo, std, scale in zip(self.algos, stds, scales):
+                gains[start:start + chunk_size] += 0.5 * numpy.log(1 + (std / scale)**2 / algo.s_ub**2)
+        return gains
+
+    def sample(self, X_sample):
+        """Sample a function for every objective evaluated at points *X_sample*.
+
+        :param X_sample: A 2d array locations, or a :class:`space.ParameterSpace`, at which
+                         to evaluate the sampled functions.
+        :returns: A 2d array of the pointwise evaluations, one row per objective.
+        """
+        samples = numpy.empty((len(self.algos), X_sample.shape[0]))
+        for group in self.groups():
+            algo = self.algos[group[0]]
+            if algo.regression_data()[1] is None:
+                samples[group[0]] = algo.sample(X_sample)
+            else:
+                Y, M2, s_ub, lambda_ = self.batch(group)
+                samples[group] = algo.sample_batch(X_sample, Y, M2, s_ub, lambda_)
+        return samples
+
+    def update(self, actions, rewards, *args):
+        """Update the model of every objective using the observations *rewards* acquired at
+        locations *actions*.
+
+        :param actions: A 2d array of locations.
+        :param rewards: A 2d array of observations, one column per objective.
+        :param `*args`: Additional parameters given to the :func:`update` of every model.
+        """
+        rewards = numpy.reshape(rewards, (len(actions), len(self.algos)))
+        for i, algo in enumerate(self.algos):
+            algo.update(actions, rewards[:, i], *args)
+
+    def kernels(self):
+        """The distinct kernel factorizations used by the models, in order of first use.
+
+        :returns: A list of :class:`KernelFactor` (or :class:`SparseKernelFactor`).
+        """
+        kernels = []
+        for algo in self.algos:
+            for kernel in [algo.kernel, getattr(algo, "pseudo_kernel", None)]:
+                if kernel is not None and not any(kernel is other for other in kernels):
+                    kernels.append(kernel)
+        return kernels
+
+    def state(self):
+        """Return the state of every model and of the kernel factorizations, which are
+        saved once even when shared. Only the factorizations for the current regularizations
+        of the models are saved, the stale ones being computed again if ever needed.
+
+        :returns: A dict of metadata and a flat dict of arrays.
+        """
+        meta, arrays = {"algos": [], "kernels": []}, {}
+        for name, objs in [("algos", self.algos), ("kernels", self.kernels())]:
+            for i, obj in enumerate(objs):
+                if name == "kernels":
+                    lambdas = [algo.lambda_ for algo in self.algos
+                               if obj is algo.kernel or obj is getattr(algo, "pseudo_kernel", None)]
+                    obj_meta, obj_arrays = obj.state(lambdas)
+                else:
+                    obj_meta, obj_arrays = obj.state()
+                meta[name].append(obj_meta)
+                arrays.update({"{}{}_{}".format(name, i, key): array for key, array in obj_arrays.items()})
+        return meta, arrays
+
+    def load_state(self, meta, arrays):
+        """Restore a state returned by :func:`state`. The kernel factorizations are only
+        restored when compatible (see :func:`KernelFactor.load_state`).
+
+        :param meta: A dict of metadata.
+        :param arrays: A flat dict of arrays (e.g. memory-mapped).
+        """
+        if len(meta["algos"]) != len(self.algos):
+            raise ValueError("The state has {} models instead of {}.".format(len(meta["algos"]), len(self.algos)))
+        for name, objs in [("algos", self.algos), ("kernels", self.kernels())]:
+            for i, (obj, obj_meta) in enumerate(zip(objs, meta[name])):
+                prefix = "{}{}_".format(name, i)
+                obj.load_state(obj_meta, {key[len(prefix):]: array for key, array in arrays.items()
+                                          if key.startswith(prefix)})
+
+    def believe(self, actions):
+        """Return a copy of this model updated with its posterior means at locations *actions*
+        as observations (kriging believer). The noise bounds of every objective are kept, so
+        that the hallucinated observations only reduce the uncertainty around *actions*. This
+        allows to sample several diverse locations before their observations are acquired.
+        This model is not modified.
+
+        The copy only holds copies of the observations. The kernel factorizations are copied
+        with their factors for the current regularizations (see :func:`KernelFactor.copy`),
+        which are extended with *actions* instead of being copied or computed again, and
+        the noise bounds are not estimated (see :func:`Kernel_TS.append`).
+
+        :param actions: A 2d array of locations.
+        :returns: A :class:`Kernel_TS_MultiObjective`.
+        """
+        actions = numpy.asarray(actions, dtype=float)
+        means, _ = self.predict(actions)
+        kernels = {}
+        for kernel in self.kernels():
+            lambdas = [algo.lambda_ for algo in self.algos
+                       if kernel is algo.kernel or kernel is getattr(algo, "pseudo_kernel", None)]
+            kernels[id(kernel)] = kernel.copy(lambdas)
+        model = copy.copy(self)
+        model.algos = []
+        for algo, mean in zip(self.algos, means):
+            algo = copy.copy(algo)
+            for key, value in list(vars(algo).items()):
+                if isinstance(value, ObservationBuffer):
+                    setattr(algo, key, value.copy())
+                elif id(value) in kernels:
+                    setattr(algo, key, kernels[id(value)])
+            algo.append(actions, mean)
+            model.algos.append(algo)
+        return model
+
+
+def sampler_error(algo, X_check, n_samples=1000):
+    """Compare the functions sampled by *algo* with the exact posterior of its regression
+    model on a few locations *X_check*. This allows to check the accuracy of the
+    approximate samplers of :class:`Kernel_TS` (e.g. to choose the number of features of
+    the `"fourier"` sampler).
+
+    :param algo: A :class:`Kernel_TS` on which :func:`update` was called at least once.
+    :param X_check: A 2d array of locations (must be the whole grid for the `"kronecker"` sampler).
+    :param n_samples: The number of sampled functions (default: 1000).
+    :returns: The maximal absolute errors of the empirical mean and covariance, relative to
+              the maximal posterior standard deviation and variance.
+    """
+    kernel, X, y = algo.regression_data()
+    counts, m2 = algo.regression_weights()
+    mean, k = kernel.predict(X, y, algo.lambda_, X_check, return_cov=True, counts=counts, m2=m2)
+    cov = algo.s_ub**2 / algo.lambda_ * k
+    samples = numpy.array([algo.sample(X_check) for _ in range(n_samples)])
+    var_max = numpy.max(numpy.diag(cov))
+    mean_error = numpy.max(numpy.abs(numpy.mean(samples, axis=0) - mean)) / numpy.sqrt(var_max)
+    cov_error = numpy.max(numpy.abs(numpy.cov(samples.T) - cov)) / var_max
+    return mean_error, cov_error
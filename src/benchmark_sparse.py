@@ -0,0 +1,98 @@
+"""This script compares the sparse regression model (:class:`algorithms.Kernel_TS_Sparse`)
+with the exact one (:class:`algorithms.Kernel_TS`) on recorded optimization histories.
+The histories of the given result folders are merged, as done for the previous results
+of an optimization, and both models are updated with them one acquisition at a time.
+For every objective and number of inducing points, it reports the time spent in the
+updates and the errors of the sparse posterior on the parameter space, relative to the
+maximal exact posterior standard deviation.
+
+USAGE : python benchmark_sparse.py results1 [results2 ...] -m 64 256 1024
+
+"""
+
+import os
+import argparse
+import time
+
+import numpy
+
+import yaml
+
+import algorithms
+import customio
+
+
+def load_histories(paths):
+    """Loads and merges the histories of previous optimizations.
+
+    :param paths: A list of result folders having the same params and objectives.
+
+    :return: The config of the first folder, the parameters and the objectives evaluated
+             with those parameters.
+    """
+    with open(os.path.join(paths[0], "config"), "r") as f:
+        config = yaml.safe_load(f)
+    X, y = [], []
+    for path in paths:
+        prev_X, prev_y = customio.read_previous_results(path, config["params"], config["objectives"])
+        X.append(prev_X.reshape(prev_X.shape[0], -1))
+        y.append(prev_y.reshape(prev_y.shape[0], -1))
+    return config, numpy.concatenate(X), numpy.concatenate(y)
+
+
+def replay(algo, X, y):
+    """Updates the algorithm with every observation in order.
+
+    :param algo: A :class:`algorithms.Kernel_TS`.
+    :param X: A 2d array of parameters.
+    :param y: A 1-D array of objective values.
+
+    :return: The time spent in the updates.
+    """
+    start = time.time()
+    for i in range(X.shape[0]):
+        algo.update(X[i:i+1], y[i:i+1])
+    return time.time() - start
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", type=str, nargs="+",
+                        help = "result folders of the previous optimizations")
+    parser.add_argument("-m", "--n-inducing", type=int, nargs="+", default=[64, 256, 1024],
+                        help = "numbers of inducing points of the sparse model")
+    parser.add_argument("-s", "--noise-ub", type=float, default=1.0,
+                        help = "initial upper bound on the noise standard deviation")
+    parser.add_argument("-n", "--n-test", type=int, default=10000,
+                        help = "maximal number of points of the parameter space used for comparison")
+    args = parser.parse_args()
+
+    config, X, y = load_histories(args.paths)
+    axes = [numpy.asarray(config["space"][p]) for p in config["params"]]
+    grid = numpy.meshgrid(*axes)
+    space = numpy.vstack([numpy.ravel(g) for g in grid]).T
+    if space.shape[0] > args.n_test:
+        space = space[numpy.random.choice(space.shape[0], args.n_test, replace=False)]
+
+    # same bandwidth rule of thumb as the optimization
+    ratio = len(axes) / 3
+    bandwidth = [(axis[-1] - axis[0]) * ratio for axis in axes]
+
+    print("{} observations of {} parameters, {} test points".format(X.shape[0], X.shape[1], space.shape[0]))
+    for i, obj in enumerate(config["objectives"]):
+        exact = algorithms.Kernel_TS(bandwidth, 1e-3, args.noise_ub)
+        t_exact = replay(exact, X, y[:, i])
+        mean, std = exact.predict(space)
+        print("{}: exact model, update {:.2f}s, noise bounds ({:.4g}, {:.4g})".format(
+            obj, t_exact, exact.s_lb, exact.s_ub))
+        for n_inducing in args.n_inducing:
+            inducing = algorithms.inducing_grid(axes, n_inducing)
+            sparse = algorithms.Kernel_TS_Sparse(bandwidth, 1e-3, args.noise_ub, inducing)
+            t_sparse = replay(sparse, X, y[:, i])
+            sparse_mean, sparse_std = sparse.predict(space)
+            print("{}: {} inducing points, update {:.2f}s, noise bounds ({:.4g}, {:.4g}), "
+                  "mean error {:.4f}, std error {:.4f}".format(
+                      obj, inducing.shape[0], t_sparse, sparse.s_lb, sparse.s_ub,
+                      numpy.max(numpy.abs(sparse_mean - mean)) / numpy.max(std),
+                      numpy.max(numpy.abs(sparse_std - std)) / numpy.max(std)))
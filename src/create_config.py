@@ -7,6 +7,7 @@ def create_config():
         "output": {  # Sets the output folder and gets previous optimization
             "saving_dir": "/path/to/folder",
             "previous": [None],
+            "resume": None, # output folder of an optimization to resume from its checkpoint
             "folder": "TEST"
         },
         "params": {  # If True params are active
@@ -26,7 +27,8 @@ def create_config():
             "Quality": False,
             "Quality_Last": False,
             "TotalTime": False,
-            "FRC": False
+            "FRC": False,
+            "FRC_Map": False
         },
         "params_space": {  # Sets the min, max and number of points for the parameter space
             "Dwelltime": [10e-6, 100e-6, 12],
@@ -46,7 +48,8 @@ def create_config():
         "objectives_values": {  # Sets the value of the different objectives
             "Signal_SQRT": 75,
             "Signal_Ratio": 75,
-            "FRC": 20e-3
+            "FRC": 20e-3,
+            "FRC_Map": 20e-3
         },
         "noise_ub_objectives": {  # Sets the values of the upper bound limits on the noise
             "Signal_SQRT": 2,
@@ -56,7 +59,8 @@ def create_config():
             "Bleach": 0.1,
             "Quality": 0.1,
             "Quality_Last": 0.1,
-            "FRC": 0.1
+            "FRC": 0.1,
+            "FRC_Map": 0.1
         },
         "autoquality": { # sets the parameters of QualityNet
             "IP": "172.16.13.216",
@@ -67,7 +71,36 @@ def create_config():
             "port": 5002
         },
         "with_time" : False, # consider imaging time as an objective when making decisions
-        "pseudo_points": False # hallucinate points in the regression model (e.g. to counter border effect)
+        "pseudo_points": False, # hallucinate points in the regression model (e.g. to counter border effect)
+        "sampler": "dense", # how functions are sampled on the parameter space ("dense", "kronecker" or "fourier")
+        "n_features": 1000, # number of random Fourier features of the "fourier" sampler
+        "n_inducing": 0, # number of inducing points of the sparse regression model (0 for the exact model)
+        "aggregate": False, # keep repeated observations at the same parameters as their count, mean and variance
+        "n_candidates": 0, # number of options sampled on the parameter space at each step (0 for the whole space)
+        "candidates": "sobol", # low-discrepancy sequence drawing the options ("sobol" or "halton")
+        "batch": False, # select the parameters of every region before acquiring them back-to-back
+        "pareto_front": False, # only present the non-dominated options
+        "cost_aware": False, # select the option maximizing the information per second of measured acquisition time
+        "coarse_size": 0, # values per parameter of a coarse grid refined around the best options (0 for the whole grid)
+        "n_refine": 3, # maximal number of options around which the coarse grid is refined at each step
+        "checkpoint_every": 10, # number of acquisitions between the checkpoints of the regression models
+        "stopping": { # sets the convergence criterion of the optimization
+            "patience": 3, # number of consecutive updates meeting the criterion
+            "improvement": 0.05, # maximal expected improvement, relative to the scale of the objectives
+            "stability": 0.9, # minimal overlap of the predicted optimal parameters between updates
+            "variance": None, # maximal posterior variance, relative to the prior variance (None to ignore it)
+            "auto": False # stop the optimization on its own once converged
+        },
+        "frc_stack": { # sets the FRC of every image of the STED stacks, saved at every step
+            "enabled": False, # compute the FRC of every image of the STED stack
+            "others": False, # also compute the FRC of the STED stacks of the other channels
+            "n_workers": 0 # number of processes computing the FRC (0 for the main process only)
+        },
+        "frc_map": { # sets the tiles of the FRC_Map objective
+            "tile_size": 64, # size of the tiles in pixels
+            "step": 32, # distance between neighbouring tiles in pixels
+            "n_workers": 0 # number of processes computing the tiles (0 for the main process only)
+        }
     }
     return config
 
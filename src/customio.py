@@ -1,11 +1,12 @@
 
 import os
+import shutil
 import yaml
 
 import numpy
 
 
-def read_previous_results(path, params=None, objectives=None, y_filename="y"):
+def read_previous_results(path, params=None, objectives=None, y_filename="y", start=0):
     """Reads previous results in the config from the given path. The previous results
     has to have the same parameters and the same objectives.
 
@@ -13,17 +14,98 @@ def read_previous_results(path, params=None, objectives=None, y_filename="y"):
     :param params: A list of params names.
     :param objectives: A list of objectives names.
     :param y_filename: The name of the file containing the evaluated objectives.
+    :param start: The time of the optimization from which the results are read (default: 0).
 
     :return: The previous parameters and the obectives evaluated with those parameters.
     """
     with open(os.path.join(path, "config"), "r") as f:
-        config = yaml.load(f)
+        config = yaml.safe_load(f)
         if params is not None:
             assert params == config["params"], "Previous results can only be used for same params."
         if objectives is not None:
             assert objectives == config["objectives"], "Previous results can only be used for same objectives."
     with open(os.path.join(path, "X"), "rb") as f:
-        previous_X = numpy.loadtxt(f, delimiter=",")[:, 1:]
+        previous_X = numpy.loadtxt(f, delimiter=",", ndmin=2)
     with open(os.path.join(path, y_filename), "rb") as f:
-        previous_y = numpy.loadtxt(f, delimiter=",")[:, 1:]
-    return previous_X, previous_y
+        previous_y = numpy.loadtxt(f, delimiter=",", ndmin=2)
+    previous_X, previous_y = previous_X[previous_X[:, 0] >= start], previous_y[previous_y[:, 0] >= start]
+    return previous_X[:, 1:], previous_y[:, 1:]
+
+
+CHECKPOINT_VERSION = 1
+
+
+def save_checkpoint(path, model, t, controller=None, cost_model=None):
+    """Saves the state of the model (see :func:`algorithms.Kernel_TS_MultiObjective.state`),
+    and optionally of the controller of its convergence and of the model of the acquisition
+    times, in a new checkpoint folder of the given path. Every array is saved in a `.npy` file
+    and the metadata in a `state` file. The `checkpoint` file, pointing to the latest
+    checkpoint folder, is replaced once every file is written and the previous checkpoint
+    folders are removed, so that a crash never leaves an incomplete checkpoint.
+
+    :param path: The output folder of the optimization.
+    :param model: A :class:`algorithms.Kernel_TS_MultiObjective`.
+    :param t: The time of the optimization.
+    :param controller: An :class:`optimization.StoppingController` (default: None).
+    :param cost_model: The :class:`algorithms.Kernel_TS` of the acquisition times (default: None).
+    """
+    meta, arrays = model.state()
+    state = {"version": CHECKPOINT_VERSION, "t": t, "model": meta}
+    if controller is not None:
+        state["controller"], controller_arrays = controller.state()
+        arrays.update({"controller_{}".format(key): array for key, array in controller_arrays.items()})
+    if cost_model is not None:
+        state["cost_model"], cost_arrays = cost_model.state()
+        arrays.update({"cost_model_{}".format(key): array for key, array in cost_arrays.items()})
+    state["arrays"] = list(arrays)
+    folder, i = "Checkpoint_{}".format(t), 0
+    # never overwrite a checkpoint, its files may be memory-mapped
+    while os.path.exists(os.path.join(path, folder)):
+        i += 1
+        folder = "Checkpoint_{}_{}".format(t, i)
+    os.makedirs(os.path.join(path, folder))
+    for key, array in arrays.items():
+        numpy.save(os.path.join(path, folder, "{}.npy".format(key)), array)
+    with open(os.path.join(path, folder, "state"), "w") as f:
+        yaml.safe_dump(state, f)
+    with open(os.path.join(path, "checkpoint.tmp"), "w") as f:
+        yaml.safe_dump({"folder": folder}, f)
+    os.replace(os.path.join(path, "checkpoint.tmp"), os.path.join(path, "checkpoint"))
+    for name in os.listdir(path):
+        if name.startswith("Checkpoint_") and name != folder:
+            # memory-mapped files of a loaded checkpoint may not be removable yet
+            shutil.rmtree(os.path.join(path, name), ignore_errors=True)
+
+
+def load_checkpoint(path, model=None, controller=None, cost_model=None):
+    """Loads the latest checkpoint of the given path in the model, in the controller of its
+    convergence and in the model of the acquisition times, if given. The arrays are
+    memory-mapped, so that the loading time does not depend on the size of the model. The
+    controller and the model of the acquisition times are only restored if their states
+    were saved in the checkpoint.
+
+    :param path: The output folder of a previous optimization.
+    :param model: A :class:`algorithms.Kernel_TS_MultiObjective` configured with the same
+                  objectives (default: None).
+    :param controller: An :class:`optimization.StoppingController` (default: None).
+    :param cost_model: The :class:`algorithms.Kernel_TS` of the acquisition times (default: None).
+
+    :return: The time of the optimization when the checkpoint was saved.
+    """
+    with open(os.path.join(path, "checkpoint"), "r") as f:
+        folder = yaml.safe_load(f)["folder"]
+    with open(os.path.join(path, folder, "state"), "r") as f:
+        state = yaml.safe_load(f)
+    if state["version"] != CHECKPOINT_VERSION:
+        raise ValueError("Unsupported checkpoint version {} (expected {}).".format(state["version"], CHECKPOINT_VERSION))
+    arrays = {key: numpy.load(os.path.join(path, folder, "{}.npy".format(key)), mmap_mode="r")
+              for key in state["arrays"]}
+    if model is not None:
+        model.load_state(state["model"], arrays)
+    if controller is not None and "controller" in state:
+        controller.load_state(state["controller"], {key[len("controller_"):]: array for key, array in arrays.items()
+                                                    if key.startswith("controller_")})
+    if cost_model is not None and "cost_model" in state:
+        cost_model.load_state(state["cost_model"], {key[len("cost_model_"):]: array for key, array in arrays.items()
+                                                    if key.startswith("cost_model_")})
+    return state["t"]
@@ -0,0 +1,56 @@
+"""This script computes the map of local resolution of an image by the fourier ring
+correlation of overlapping tiles (see :func:`fsc.resolution_map`). The image is either
+an overview fetched from Imspector (see :func:`microscope.get_overview`) or a saved
+image. The tiles are computed one row at a time, so that large overviews are never
+copied at once. The map is saved as a csv file of resolutions in nanometers, with nan
+values for the tiles whose FRC never crosses the threshold.
+
+USAGE : python frc_map.py map.csv [-i image.tiff -p 0.02] [-s 64] [-t 32] [-w 4]
+
+"""
+
+import argparse
+import time
+
+import numpy
+
+import fsc
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("output", type=str,
+                        help = "csv file of the resolution map")
+    parser.add_argument("-i", "--image", type=str, default=None,
+                        help = "saved image to use instead of an overview from Imspector")
+    parser.add_argument("-p", "--pixelsize", type=float, default=None,
+                        help = "size of the pixels in µm (default: from the Imspector configuration)")
+    parser.add_argument("-s", "--tile-size", type=int, default=64,
+                        help = "size of the tiles in pixels")
+    parser.add_argument("-t", "--step", type=int, default=None,
+                        help = "distance between neighbouring tiles in pixels (default: half a tile)")
+    parser.add_argument("-w", "--n-workers", type=int, default=0,
+                        help = "number of processes computing the tiles")
+    args = parser.parse_args()
+
+    if args.image is None:
+        import microscope
+        config = microscope.get_config("Setting configuration for overview")
+        img = microscope.get_overview(config)
+        pixelsize = microscope.get_pixelsize(config)[0] * 1e6 if args.pixelsize is None else args.pixelsize
+    else:
+        import skimage.io
+        assert args.pixelsize is not None, "The pixel size is needed for a saved image."
+        img = skimage.io.imread(args.image)
+        pixelsize = args.pixelsize
+
+    start = time.time()
+    spatialfreqs = fsc.resolution_map(img, pixelsize, args.tile_size, args.step, args.n_workers)
+    fsc.shutdown_pools()
+    print("{} x {} tiles of {} pixels in {:.2f}s".format(*spatialfreqs.shape, args.tile_size, time.time() - start))
+
+    with numpy.errstate(divide="ignore"):
+        resolutions = numpy.where(spatialfreqs > 0, 1e+3 / spatialfreqs, numpy.nan)
+    print("median resolution {:.1f} nm".format(numpy.nanmedian(resolutions)))
+    numpy.savetxt(args.output, resolutions, delimiter=",", fmt="%.2f")
@@ -10,32 +10,167 @@ import numpy
 import random
 import os
 import itertools
+import functools
+import atexit
+
+from concurrent.futures import ProcessPoolExecutor
 
 
 def split_image_array(img, factor):
-    """Splits a 2D :method:`numpy.array` into 4 independant images.
+    """Splits a 2D :method:`numpy.array` into `factor**2` independant images. The k-th
+    image contains the k-th pixel (in row-major order) of every `factor` x `factor` block.
+    The last rows and columns that do not fill a complete block are dropped. A stack of
+    images, given as a 3D :method:`numpy.array`, is split image by image.
 
-    :param img: A 2D :method:`numpy.array`.
+    :param img: A 2D :method:`numpy.array`, or a 3D :method:`numpy.array` of images.
     :param factor: The shape of the sampled array.
 
-    :return: A list of 4 2D :method:`numpy.array`
+    :return: A 3D :method:`numpy.array` of shape (`factor**2`, `h // factor`, `w // factor`),
+             or a 4D :method:`numpy.array` with one such array per image of the stack.
+    """
+    img = numpy.asarray(img)
+    lead = img.shape[:-2]
+    h, w = img.shape[-2] // factor, img.shape[-1] // factor
+    blocks = img[..., :h * factor, :w * factor].reshape(lead + (h, factor, w, factor))
+    axes = tuple(range(len(lead)))
+    blocks = blocks.transpose(axes + tuple(len(lead) + i for i in (1, 3, 0, 2)))
+    return numpy.array(blocks, dtype=numpy.float64).reshape(lead + (factor**2, h, w))
+
+
+def ring_index(shape):
+    """Computes the ring of every frequency of the fourier transform of an image. The
+    ring `r` contains the frequencies at a distance in [`r - 0.5`, `r + 0.5`) from the
+    center of the shifted transform, and the frequencies beyond the last ring are
+    assigned to the ring `rmax`. The index is returned in the order of the unshifted
+    transform, as given by :func:`numpy.fft.fft2`.
+
+    :param shape: The shape of the image.
+
+    :return: A 2D :method:`numpy.array` of ring indices and the number of rings `rmax`.
+    """
+    h, w = shape
+    yc, xc = int((h + 1) / 2) + 1, int((w + 1) / 2) + 1
+    rmax = max(min([w - xc, h - yc]), 0)
+    x, y = numpy.ogrid[0:h, 0:w]
+    index = numpy.floor(numpy.sqrt((x - xc)**2 + (y - yc)**2) + 0.5).astype(int)
+    index = numpy.minimum(index, rmax)
+    return numpy.fft.ifftshift(index), rmax
+
+
+def ring_sum(index, rmax, values=None):
+    """Sums values over the rings of the fourier transform in a single pass.
+
+    :param index: A 2D :method:`numpy.array` of ring indices, as returned by :func:`ring_index`.
+    :param rmax: The number of rings.
+    :param values: A 2D :method:`numpy.array` of real values (default: None, the pixels are counted).
+
+    :return: A 1D :method:`numpy.array` of the sums in every rings.
     """
-    d = img.shape[0]
-    newD = int(d/factor)
-    im = [numpy.zeros((newD, newD)) for i in range(4)]
-    for j in range(0, d-1, factor):
-        for i in range(0, d-1, factor):
-            sup = img[j:j+factor, i:i+factor]
-            sup = sup.ravel()
-            for k in range(len(sup)):
-                a, b = int(j / factor), int(i / factor)
-                im[k][a, b] += sup[k]
-    return im
+    weights = None if values is None else values.ravel()
+    return numpy.bincount(index.ravel(), weights=weights, minlength=rmax + 1)[:rmax]
+
+
+@functools.lru_cache(maxsize=8)
+def frc_geometry(shape, dtype):
+    """Computes the quantities of the fourier shell correlation that only depend on
+    the shape of the images. The results are cached for the last shapes and dtypes,
+    and the hits and misses of the cache are given by `frc_geometry.cache_info()`.
+    The returned arrays are read-only.
+
+    :param shape: A tuple of the shape of the images.
+    :param dtype: The :class:`numpy.dtype` of the images.
+
+    :return: A tuple of the Hamming window (see :func:`Hamming`), the ring indices and
+             the number of rings `rmax` (see :func:`ring_index`), the number of pixels
+             in every rings and the threshold curve (see :func:`sigma_curve`).
+    """
+    h, w = shape
+    window = Hamming(w, h).astype(numpy.result_type(dtype, numpy.float64))
+    index, rmax = ring_index(shape)
+    nPx = ring_sum(index, rmax)
+    sigma = sigma_curve(nPx)
+    for array in (window, index, nPx, sigma):
+        array.flags.writeable = False
+    return window, index, rmax, nPx, sigma
+
+
+@functools.lru_cache(maxsize=8)
+def rfft_rings(shape):
+    """Computes the rings of the half spectrum given by :func:`numpy.fft.rfft2`. The
+    frequencies of the full spectrum that are not kept are the conjugates of the kept
+    frequencies of the columns `1` to `(w + 1) // 2 - 1`, and their rings are given
+    separately, so that sums over the full rings are computed exactly from the half
+    spectrum (see :func:`half_ring_sum`). The results are cached for the last shapes.
+
+    :param shape: A tuple of the shape of the images.
+
+    :return: A tuple of the ring indices of the half spectrum, the ring indices of the
+             conjugate frequencies of the mirrored columns, and the mirrored columns.
+    """
+    h, w = shape
+    index, rmax = frc_geometry(shape, numpy.dtype(numpy.float64))[1:3]
+    columns = numpy.arange(1, (w + 1) // 2)
+    half = index[:, :w // 2 + 1].copy()
+    mirror = index[(-numpy.arange(h)) % h][:, (-columns) % w]
+    for array in (half, mirror, columns):
+        array.flags.writeable = False
+    return half, mirror, columns
+
+
+def half_ring_sum(rings, rmax, values, conjugate=False):
+    """Sums values of half spectra over the rings of the full spectra in a single pass.
+
+    :param rings: The tuple returned by :func:`rfft_rings`.
+    :param rmax: The number of rings.
+    :param values: A :method:`numpy.array` of real values, whose last two dimensions are
+                   the half spectra.
+    :param conjugate: If True, the values are the imaginary parts of complex values,
+                      whose conjugate frequencies are negated (default: False).
+
+    :return: A :method:`numpy.array` of the sums in every rings, along the last dimension.
+    """
+    half, mirror, columns = rings
+    lead = values.shape[:-2]
+    values = values.reshape((-1,) + values.shape[-2:])
+    n = values.shape[0]
+    offsets = numpy.arange(n)[:, numpy.newaxis] * (rmax + 1)
+    mirrored = values[:, :, columns]
+    bins = numpy.concatenate([half.ravel() + offsets, mirror.ravel() + offsets], axis=1)
+    weights = numpy.concatenate([values.reshape(n, -1), (-mirrored if conjugate else mirrored).reshape(n, -1)], axis=1)
+    sums = numpy.bincount(bins.ravel(), weights=weights.ravel(), minlength=n * (rmax + 1))
+    return sums.reshape(lead + (rmax + 1,))[..., :rmax]
+
+
+def pairwise_shell_corr(imgs):
+    """Computes the fourier shell correlation of every pair of noise independant images
+    [Tortarolo2018]_. The windowed spectrum of every image is computed once with
+    :func:`numpy.fft.rfft2`, and the rings of all pairs are summed in a single pass.
+
+    :param imgs: A 3D :method:`numpy.array` of images of the same shape, e.g. as returned
+                 by :func:`split_image_array`, or a 4D :method:`numpy.array` of such
+                 groups of images, which are all computed in the same pass.
+
+    :return: A 2D :method:`numpy.array` of the fourier shell correlations, one row per pair
+             in the order of :func:`itertools.combinations` (a 3D :method:`numpy.array`
+             with one such array per group for 4D inputs), and the number of pixels in
+             every rings.
+    """
+    imgs = numpy.asarray(imgs)
+    Hm, _, rmax, nPx, _ = frc_geometry(imgs.shape[-2:], imgs.dtype)
+    rings = rfft_rings(imgs.shape[-2:])
+    spectra = numpy.fft.rfft2(imgs * Hm)
+    first, second = numpy.triu_indices(imgs.shape[-3], k=1)
+
+    prod = spectra[..., first, :, :] * numpy.conjugate(spectra[..., second, :, :])
+    corr = half_ring_sum(rings, rmax, prod.real) + 1j * half_ring_sum(rings, rmax, prod.imag, conjugate=True)
+    power = half_ring_sum(rings, rmax, spectra.real**2 + spectra.imag**2)
+    return numpy.abs(corr) / numpy.sqrt(power[..., first, :] * power[..., second, :]), nPx
 
 
 def fourier_shell_corr(img1, img2):
     """Computes the fourier shell correlation from two noise independant images.
-    [Tortarolo2018]_.
+    [Tortarolo2018]_. The window and the rings are shared by the images of the same
+    shape (see :func:`frc_geometry`).
 
     :param img1: A 2D :method:`numpy.array`
     :param img2: A 2D :method:`numpy.array`
@@ -43,69 +178,172 @@ def fourier_shell_corr(img1, img2):
     :return: The fourier shell correlation and the number of pixels in every rings
              to be used in the :func:`SNR`.
     """
-    fscList, nPx = [], []
-    Hm = Hamming(img1.shape[1], img1.shape[0])
-    fimg1 = numpy.fft.fftshift(numpy.fft.fft2(img1 * Hm))
-    fimg2 = numpy.fft.fftshift(numpy.fft.fft2(img2 * Hm))
+    frc, nPx = pairwise_shell_corr(numpy.stack([img1, img2]))
+    return frc[0], nPx
 
-    h, w = fimg1.shape
-    yc, xc = int((h + 1) / 2) + 1, int((w + 1) / 2) + 1
-    rmax = min([w - xc, h - yc])
-    for r in range(rmax):
-        x, y = numpy.ogrid[0:fimg1.shape[0], 0:fimg1.shape[1]]
-        maskA = numpy.sqrt((x - xc)**2 + (y - yc)**2) >= r - 0.5
-        maskB = numpy.sqrt((x - xc)**2 + (y - yc)**2) < r + 0.5
-        mask = maskA * maskB
 
-        corr = numpy.sum(fimg1[mask] * numpy.conjugate(fimg2[mask]))
-        absA = numpy.sum(numpy.abs(fimg1[mask]**2))
-        absB = numpy.sum(numpy.abs(fimg2[mask]**2))
+def spatial_frequency(imgs, pixelsize, factor=2, N=3):
+    """Computes the spatial frequency at which the fourier ring correlation of the
+    sub-images of an image (see :func:`split_image_array`), averaged over all pairs and
+    smoothed with :func:`moving_average`, meets the smoothed threshold curve
+    (see :func:`meeting_point`). The images of a stack are computed in a single batch.
+
+    :param imgs: A 2D :method:`numpy.array`, or a 3D :method:`numpy.array` of images of the
+                 same shape.
+    :param pixelsize: The size of the pixels (µm).
+    :param factor: The shape of the sampled array (default: 2).
+    :param N: Half length of the moving average kernel (default: 3).
+
+    :return: The spatial frequency (1/µm), or a 1D :method:`numpy.array` of spatial
+             frequencies for 3D inputs.
+    """
+    subimgs = split_image_array(imgs, factor)
+    frc, _ = pairwise_shell_corr(subimgs)
+    sigma = frc_geometry(subimgs.shape[-2:], subimgs.dtype)[-1]
+    frc = numpy.mean(frc, axis=-2)
+    freq = numpy.arange(frc.shape[-1]) / (subimgs.shape[-2] * pixelsize)
+    return meeting_point(moving_average(frc, N), freq, moving_average(sigma, N))
+
+
+pools = {}
+
+
+def process_pool(n_workers):
+    """Returns a pool of processes, created on its first use and then reused, so that the
+    processes are not started again at every acquisition. The pools are shut down by
+    :func:`shutdown_pools`.
+
+    :param n_workers: The number of processes.
+
+    :return: A :class:`concurrent.futures.ProcessPoolExecutor`.
+    """
+    if n_workers not in pools:
+        pools[n_workers] = ProcessPoolExecutor(n_workers)
+    return pools[n_workers]
+
+
+@atexit.register
+def shutdown_pools():
+    """Shuts down the pools of processes of :func:`process_pool`, e.g. at the end of an
+    optimization, and at the latest when the interpreter exits. A pool used again is
+    created again.
+    """
+    while pools:
+        _, pool = pools.popitem()
+        pool.shutdown()
+
+
+def stack_spatial_frequency(imgs, pixelsize, n_workers=0, **kwargs):
+    """Computes the :func:`spatial_frequency` of every image of a stack. The stack is
+    split in chunks computed by a pool of processes (see :func:`process_pool`), each process
+    keeping its own cache of the window and the rings (see :func:`frc_geometry`).
+
+    :param imgs: A 3D :method:`numpy.array` of images of the same shape.
+    :param pixelsize: The size of the pixels (µm).
+    :param n_workers: The number of processes (default: 0, the whole stack is computed
+                      in a single batch by the calling process).
+    :param kwargs: The other parameters of :func:`spatial_frequency`.
 
-        fscList.append(numpy.abs(corr) / numpy.sqrt(absA * absB))
-        nPx.append(mask.sum())
-    return numpy.array(fscList), numpy.array(nPx)
+    :return: A 1D :method:`numpy.array` of spatial frequencies (1/µm).
+    """
+    imgs = numpy.asarray(imgs)
+    n_chunks = min(n_workers, imgs.shape[0])
+    if n_chunks <= 1:
+        return spatial_frequency(imgs, pixelsize, **kwargs)
+    compute = functools.partial(spatial_frequency, pixelsize=pixelsize, **kwargs)
+    return numpy.concatenate(list(process_pool(n_chunks).map(compute, numpy.array_split(imgs, n_chunks))))
+
+
+def tile_images(img, size, step):
+    """Creates overlapping square tiles of an image, without copying it. The tiles that
+    would exceed the image are dropped. The size of the tiles is clamped to the smallest
+    side of the image, so that a small image gives a single tile.
+
+    :param img: A 2D :method:`numpy.array`.
+    :param size: The size of the tiles (pixels).
+    :param step: The distance between the corners of neighbouring tiles (pixels).
+
+    :return: A 4D :method:`numpy.array` view of shape (`ny`, `nx`, `size`, `size`), with
+             the tile at row `i` and column `j` starting at pixel (`i * step`, `j * step`).
+    """
+    img = numpy.asarray(img)
+    size = min(size, *img.shape)
+    tiles = numpy.lib.stride_tricks.sliding_window_view(img, (size, size))
+    return tiles[::step, ::step]
+
+
+def resolution_map(img, pixelsize, size, step=None, n_workers=0, **kwargs):
+    """Computes the map of local resolution of an image, as the :func:`spatial_frequency`
+    of overlapping tiles (see :func:`tile_images`). The tiles are computed one row at a
+    time, every row as a single batch sharing the cached window and rings, so that large
+    images, e.g. overviews, are streamed instead of copied at once. The rows are
+    distributed to a pool of processes with *n_workers*, reused across calls (see
+    :func:`process_pool`).
+
+    :param img: A 2D :method:`numpy.array`.
+    :param pixelsize: The size of the pixels (µm).
+    :param size: The size of the tiles (pixels).
+    :param step: The distance between neighbouring tiles (default: None, half a tile).
+    :param n_workers: The number of processes (default: 0, the rows are computed by the
+                      calling process).
+    :param kwargs: The other parameters of :func:`spatial_frequency`.
+
+    :return: A 2D :method:`numpy.array` of spatial frequencies (1/µm), one per tile.
+    """
+    tiles = tile_images(img, size, size // 2 if step is None else step)
+    compute = functools.partial(spatial_frequency, pixelsize=pixelsize, **kwargs)
+    if n_workers > 1 and tiles.shape[0] > 1:
+        rows = list(process_pool(n_workers).map(compute, tiles))
+    else:
+        rows = [compute(row) for row in tiles]
+    return numpy.array(rows).reshape(tiles.shape[:2])
 
 
 def meeting_point(fsc, res, thres):
     """Finds the first meeting point between the fourier shell correlation curve
-    and the choosen threshold. It returns 0 if the fourier shell correlation never
-    crosses the threshold curve.
+    and the choosen threshold, i.e. the first point below the threshold after a point
+    above it. It returns the last frequency if the fourier shell correlation never goes
+    back below the threshold, and 0 if it is never above the threshold. Several curves
+    are processed at once when given as the rows of a 2D :method:`numpy.array`.
 
-    :param fsc: A 1D :method:`numpy.array` containing the fourier shell correlation.
+    :param fsc: A 1D or 2D :method:`numpy.array` containing the fourier shell correlation.
     :param res: A list of the frequency associated with the fourier shell correaltion.
     :param thres: The threshold to use for the meeting point.
 
     :return: The frequency at which the fourier shell correlation croses the threshold
-             curve.
+             curve, or a 1D :method:`numpy.array` of frequencies for 2D inputs.
     """
-    start = False
-    for i, state in enumerate((fsc < thres)):
-        if state == False:
-            start = True
-        if (start == True) & (state == True):
-            return (res[i] + res[i-1])/2
-        if (i == fsc.size - 1) & (start == True):
-            return res[i]
-    return 0
+    below = numpy.asarray(fsc) < numpy.asarray(thres)
+    res = numpy.broadcast_to(res, below.shape)
+    if below.shape[-1] == 0:
+        return numpy.zeros(below.shape[:-1])[()]
+    started = numpy.any(~below, axis=-1)
+    first = numpy.argmax(~below, axis=-1)
+    crossing = below & (numpy.arange(below.shape[-1]) > first[..., numpy.newaxis]) & started[..., numpy.newaxis]
+    i = numpy.argmax(crossing, axis=-1)[..., numpy.newaxis]
+    midpoint = (numpy.take_along_axis(res, i, -1) + numpy.take_along_axis(res, numpy.maximum(i - 1, 0), -1))[..., 0] / 2
+    return numpy.where(numpy.any(crossing, axis=-1), midpoint, numpy.where(started, res[..., -1], 0))[()]
 
 
 def moving_average(x, N):
-    """Performs a moving average on a 1D :method:`numpy.array`.
+    """Performs a moving average on a 1D :method:`numpy.array`, or on every row of a
+    2D :method:`numpy.array`, from its cumulative sum. The `i`-th value is the mean of
+    the values from `i - N` (included) to `i + N` (excluded), the kernel being cropped
+    at the borders.
 
-    :param x: A 1D :method:`numpy.array`.
+    :param x: A 1D or 2D :method:`numpy.array`.
     :param N: Half length of the kernel of full size (2*N+1).
 
-    :return: A 1D :method:`numpy.array` averaged.
-    """
-    smoothx = numpy.zeros(x.shape)
-    for i in range(x.size):
-        if i <= N:
-            smoothx[i] = numpy.mean(x[ : i + N])
-        elif (i > N) & (i < x.size - N):
-            smoothx[i] = numpy.mean(x[i - N : i + N])
-        elif i >= N:
-            smoothx[i] = numpy.mean(x[i - N : ])
-    return smoothx
+    :return: A :method:`numpy.array` averaged, of the same shape as `x`.
+    """
+    x = numpy.asarray(x, dtype=numpy.float64)
+    size = x.shape[-1]
+    start = numpy.maximum(numpy.arange(size) - N, 0)
+    end = numpy.minimum(numpy.arange(size) + N, size)
+    cumsum = numpy.zeros(x.shape[:-1] + (size + 1,))
+    numpy.cumsum(x, axis=-1, out=cumsum[..., 1:])
+    with numpy.errstate(invalid="ignore"):
+        return (cumsum[..., end] - cumsum[..., start]) / (end - start)
 
 
 def sigma_curve(N, sig = 3):
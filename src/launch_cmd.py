@@ -10,6 +10,11 @@ that has been changed before the experiment. To do so, the user should use the
 parser -c with the given configuration parameters filename.
 USAGE : python launch_cmd.py -c config
 
+With both options, an optimization can be resumed from the checkpoint saved in its
+output folder (e.g. after a crash or to change the configuration) using the parser -r.
+The output folder may be the same as the resumed one.
+USAGE : python launch_cmd.py -c config -r /path/to/output/folder
+
 """
 
 import yaml
@@ -21,6 +26,7 @@ matplotlib.use("TkAgg")
 
 from optimization import Optimizer
 import create_config
+import fsc
 import microscope
 
 
@@ -37,6 +43,8 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("-c", "--config", type=str,
                         help = "name of the file or path to the configuration parameters")
+    parser.add_argument("-r", "--resume", type=str,
+                        help = "output folder of the optimization to resume from its checkpoint")
     args = parser.parse_args()
 
     # setting the confocal and the sted configuration of the microscope
@@ -48,7 +56,7 @@ if __name__ == "__main__":
 
     if args.config:
         with open(args.config, "r") as f:
-            config = yaml.load(f)
+            config = yaml.safe_load(f)
     else:
         config = create_config.create_config()
         saving_dir = input("Where should the results be saved? ")
@@ -118,6 +126,9 @@ if __name__ == "__main__":
         config["pseudo_points"] = (pseudo_points == "y")
 
 
+    if args.resume:
+        config["output"]["resume"] = args.resume
+
     # CONFIGURES THE OPTIMIZATION ROUTINE WITH THE GIVEN CONFIGURATION
     answer = yesno_input("Do you want to be able to thrash the data every region that is scanned? (y/n) ")
     thrash_data = (answer == "y")
@@ -167,8 +178,13 @@ if __name__ == "__main__":
     readjust = False
     while more_regions:
         OPT.run(readjust)
+        if OPT.controller.stop:
+            print("Stopping the optimization because it has converged.")
+            break
         answer = yesno_input("Do you want to select more regions and continue? (y/n) ")
         more_regions = (answer == "y")
         if more_regions:
             answer = yesno_input("Do you want to readjust focus parameters? (y/n) ")
             readjust = (answer == "y")
+    # the processes computing the FRC are not needed anymore
+    fsc.shutdown_pools()
@@ -1,12 +1,13 @@
 
 """This module contains classes that implement several objectives to optimize.
 One can define a new objective by inheriting abstract class :class:`Objective`.
+The objectives of an acquisition share the quantities derived from its images through
+an :class:`AcquisitionContext`.
 """
 
 from abc import ABC, abstractmethod
 
 import numpy
-import itertools
 
 from statsmodels.tsa.stattools import acf
 
@@ -17,11 +18,118 @@ import utils
 import user
 
 
+class AcquisitionContext:
+    """Images of an acquisition and the quantities derived from them, shared by the
+    objectives evaluated on this acquisition. Every quantity is computed on its first
+    access and then reused, so that it is computed at most once per acquisition. The
+    foreground masks are computed from the images if they are not given.
+
+    :param sted_stack: A list of STED images.
+    :param confocal_init: A confocal image acquired before the STED stack.
+    :param confocal_end: A confocal image acquired after the STED stack.
+    :param sted_fg: A background mask of the first STED image in the stack (default: None,
+                    the foreground of the first STED image within the confocal foreground).
+    :param confocal_fg: A background mask of the initial confocal image (default: None,
+                        see :func:`utils.get_foreground`).
+    """
+    def __init__(self, sted_stack, confocal_init, confocal_end, sted_fg=None, confocal_fg=None):
+        self.sted_stack = sted_stack
+        self.confocal_init = confocal_init
+        self.confocal_end = confocal_end
+        self.cache = {}
+        if sted_fg is not None:
+            self.cache["sted_fg"] = sted_fg
+        if confocal_fg is not None:
+            self.cache["confocal_fg"] = confocal_fg
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute, *args):
+        """Returns a quantity derived from the images, computed only on its first access.
+
+        :param key: A hashable key identifying the quantity.
+        :param compute: The function computing the quantity.
+        :param args: The arguments of *compute*.
+
+        :returns: The quantity.
+        """
+        if key in self.cache:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.cache[key] = compute(*args)
+        return self.cache[key]
+
+    @property
+    def confocal_fg(self):
+        """The background mask of the initial confocal image."""
+        return self.get("confocal_fg", utils.get_foreground, self.confocal_init)
+
+    @property
+    def sted_fg(self):
+        """The background mask of the first STED image, restricted to the confocal foreground."""
+        return self.get("sted_fg", lambda: utils.get_foreground(self.sted_stack[0]) * self.confocal_fg)
+
+    @property
+    def sted_foreground(self):
+        """The foreground pixels of the first STED image."""
+        return self.get("sted_foreground", lambda: self.sted_stack[0][self.sted_fg])
+
+    @property
+    def sted_background(self):
+        """The background pixels of the first STED image."""
+        return self.get("sted_background", lambda: self.sted_stack[0][numpy.invert(self.sted_fg)])
+
+    @property
+    def confocal_init_foreground(self):
+        """The foreground pixels of the initial confocal image."""
+        return self.get("confocal_init_foreground", lambda: self.confocal_init[self.confocal_fg])
+
+    @property
+    def confocal_end_foreground(self):
+        """The pixels of the final confocal image in the foreground of the initial one."""
+        return self.get("confocal_end_foreground", lambda: self.confocal_end[self.confocal_fg])
+
+    def sted_image(self, idx=0):
+        """Converts a STED image of the stack to an array.
+
+        :param idx: The index of the image in the stack (default: 0).
+
+        :returns: The image as a 2d array.
+        """
+        return self.get(("sted_image", idx), numpy.array, self.sted_stack[idx])
+
+    def float_image(self, idx=0):
+        """Converts a STED image of the stack to a float image (see :func:`utils.img2float`).
+
+        :param idx: The index of the image in the stack (default: 0).
+
+        :returns: The image with pixels in float.
+        """
+        return self.get(("float_image", idx), utils.img2float, self.sted_stack[idx])
+
+
 class Objective(ABC):
     """Abstract class to implement an objective to optimize. When inheriting this class,
     one needs to define an attribute `label` to be used for figure labels, and a
-    function :func:`evaluate` to be called during optimization.
+    function :func:`evaluate` to be called during optimization. The attribute
+    `select_optimal` selects the index of the best of several values, :func:`numpy.argmax`
+    by default. The attribute `uses_foreground` tells whether :func:`evaluate` uses the
+    foreground masks, so that they are only computed for the objectives needing them.
     """
+    select_optimal = numpy.argmax
+    uses_foreground = True
+
+    @property
+    def maximize(self):
+        """Whether the objective is maximized, i.e. whether :func:`select_optimal` selects
+        the largest of several values."""
+        if self.select_optimal is numpy.argmin:
+            return False
+        if self.select_optimal is numpy.argmax:
+            return True
+        return self.select_optimal(numpy.array([0, 1])) == 1
+
     @abstractmethod
     def evaluate(self, sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg):
         """Compute the value of the objective given the result of an acquisition.
@@ -36,6 +144,19 @@ class Objective(ABC):
         """
         raise NotImplementedError
 
+    def evaluate_context(self, context):
+        """Compute the value of the objective given the shared context of an acquisition.
+        By default, it calls :func:`evaluate` with the images and the foreground masks of
+        the context, or None masks if `uses_foreground` is False. Objectives can override
+        it to reuse the quantities of the context.
+
+        :param context: An :class:`AcquisitionContext`.
+        """
+        if not self.uses_foreground:
+            return self.evaluate(context.sted_stack, context.confocal_init, context.confocal_end, None, None)
+        return self.evaluate(context.sted_stack, context.confocal_init, context.confocal_end,
+                             context.sted_fg, context.confocal_fg)
+
     def mirror_ticks(self, ticks):
         """Tick values to override the true *tick* values for easier plot understanding.
 
@@ -80,10 +201,13 @@ class Signal_Ratio(Objective):
                   SNR value otherwise.
 
         """
-        if numpy.any(sted_fg):
-            foreground = numpy.percentile(sted_stack[0][sted_fg], self.percentile)
-            background = numpy.mean(sted_stack[0][numpy.invert(sted_fg)])
-            ratio = (foreground - background) / numpy.percentile(confocal_init[confocal_fg], self.percentile)
+        return self.evaluate_context(AcquisitionContext(sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg))
+
+    def evaluate_context(self, context):
+        if numpy.any(context.sted_fg):
+            foreground = numpy.percentile(context.sted_foreground, self.percentile)
+            background = numpy.mean(context.sted_background)
+            ratio = (foreground - background) / numpy.percentile(context.confocal_init_foreground, self.percentile)
             if ratio < 0:
                 return None
             else:
@@ -106,6 +230,8 @@ class FWHM(Objective):
     :param pixelsize: Size of a pixel in a STED image (in nm).
     :param `**kwargs`: This method also takes the keyword arguments for :func:`user.get_lines`.
     """
+    uses_foreground = False
+
     def __init__(self, pixelsize, **kwargs):
         self.label = "FWHM (nm)"
         self.select_optimal = numpy.argmin
@@ -148,6 +274,8 @@ class Autocorrelation(Objective):
 
     :param `**kwargs`: This method also takes the keyword arguments for :func:`user.get_lines`.
     """
+    uses_foreground = False
+
     def __init__(self, **kwargs):
         self.label = "Autocorrelation"
         self.select_optimal = numpy.argmax
@@ -173,6 +301,8 @@ class Score(Objective):
 
     :param `**kwargs`: This method also takes the keyword arguments for :func:`user.give_score`.
     """
+    uses_foreground = False
+
     def __init__(self, label, select_optimal=numpy.argmax, idx=0, **kwargs):
         self.label = label
         self.select_optimal = select_optimal
@@ -189,8 +319,11 @@ class Bleach(Objective):
         self.select_optimal = numpy.argmin
 
     def evaluate(self, sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg):
-        signal_i = numpy.mean(confocal_init[confocal_fg])
-        signal_e = numpy.mean(confocal_end[confocal_fg])
+        return self.evaluate_context(AcquisitionContext(sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg))
+
+    def evaluate_context(self, context):
+        signal_i = numpy.mean(context.confocal_init_foreground)
+        signal_e = numpy.mean(context.confocal_end_foreground)
         bleach = (signal_i - signal_e) / signal_i
         return bleach
 
@@ -203,40 +336,102 @@ class ScoreNet(Objective):
         self.idx = idx
 
     def evaluate(self, sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg):
-        score = self.net.predict(utils.img2float(sted_stack[self.idx]))
+        return self.evaluate_context(AcquisitionContext(sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg))
+
+    def evaluate_context(self, context):
+        score = self.net.predict(context.float_image(self.idx))
         print("Net", self.label, "score", score)
         return score
 
 
 class FRC(Objective):
-    def __init__(self, pixelsize):
+    def __init__(self, pixelsize, n_workers=0):
         self.label = "FRC"
         self.select_optimal = numpy.argmax
         self.pixelsize = pixelsize # µm
         self.max_spatialfreq = 1 / (2 * pixelsize) # 1/µm
+        self.n_workers = n_workers
 
     def evaluate(self, sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg):
-        sted = numpy.array(sted_stack[0])
+        return self.evaluate_context(AcquisitionContext(sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg))
+
+    def evaluate_context(self, context):
+        sted = context.sted_image()
         # verify that the STED image is of squared shape
         assert sted.shape[0] == sted.shape[1],\
             "The STED image is not a square, you cannot evaluate the Fourier Ring Correlation!"
-        imgs = fsc.split_image_array(sted, 2)
-        fourierringcorr, sigmacurves, freqs = [], [], []
-        for im1, im2 in itertools.combinations(imgs, 2):
-            frc, nPx = fsc.fourier_shell_corr(im1, im2)
-            sigma = fsc.sigma_curve(nPx)
-            freq = numpy.arange(frc.shape[0]) / (im1.shape[0] * self.pixelsize)
-            fourierringcorr.append(frc)
-            sigmacurves.append(sigma)
-            freqs.append(freq)
-
-        frc = numpy.mean(numpy.array(fourierringcorr), axis = 0)
-        sigma = numpy.mean(numpy.array(sigmacurves), axis = 0)
-        freq = numpy.mean(numpy.array(freqs), axis = 0)
-
-        spatialfreq = fsc.meeting_point(fsc.moving_average(frc, 3), freq, fsc.moving_average(sigma, 3))
+        spatialfreq = context.get(("spatial_frequency", self.pixelsize), fsc.spatial_frequency, sted, self.pixelsize)
 
         return spatialfreq / self.max_spatialfreq
 
+    def evaluate_stacks(self, stacks, context=None):
+        """Computes the objective on every image of the given STED stacks. The images of
+        all stacks are computed as a single batch (see :func:`fsc.stack_spatial_frequency`).
+        Given the context of the acquisition of the first stack, the spatial frequency of its
+        first image is taken from the context, where :func:`evaluate_context` caches it.
+
+        :param stacks: A list of STED stacks, e.g. the stack of every channel.
+        :param context: The :class:`AcquisitionContext` of the first stack (default: None).
+
+        :returns: A list of 1D arrays of the objective, one per stack.
+        """
+        frames = numpy.concatenate([numpy.asarray(stack) for stack in stacks])
+        assert frames.shape[1] == frames.shape[2],\
+            "The STED images are not squares, you cannot evaluate the Fourier Ring Correlation!"
+        if context is None:
+            spatialfreqs = fsc.stack_spatial_frequency(frames, self.pixelsize, self.n_workers)
+        else:
+            first = context.get(("spatial_frequency", self.pixelsize), fsc.spatial_frequency,
+                                context.sted_image(), self.pixelsize)
+            spatialfreqs = numpy.array([first])
+            if len(frames) > 1:
+                spatialfreqs = numpy.concatenate([spatialfreqs, fsc.stack_spatial_frequency(frames[1:], self.pixelsize, self.n_workers)])
+        return numpy.split(spatialfreqs / self.max_spatialfreq, numpy.cumsum([len(stack) for stack in stacks])[:-1])
+
+
+class FRC_Map(FRC):
+    """Objective corresponding to the local resolution of the foreground of the STED
+    image. The FRC is computed on overlapping tiles of the first STED image (see
+    :func:`fsc.resolution_map`), and the normalized spatial frequencies of the tiles are
+    averaged, weighted by the fraction of foreground pixels in every tile. An image
+    smaller than the tiles is a single tile, i.e. its FRC is the global one.
+
+    :param float pixelsize: The size of the pixels (µm).
+    :param int tile_size: The size of the tiles (pixels).
+    :param int step: The distance between neighbouring tiles (pixels).
+    :param int n_workers: The number of processes computing the tiles (0 for the main
+                          process only).
+    """
+    def __init__(self, pixelsize, tile_size=64, step=32, n_workers=0):
+        super().__init__(pixelsize, n_workers)
+        self.label = "FRC Map"
+        self.tile_size = tile_size
+        self.step = step
+
+    def evaluate(self, sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg):
+        """Computes the average local resolution of the foreground given the result of
+        an acquisition.
+
+        :param sted_stack: A list of STED images.
+        :param confocal_init: A confocal image acquired before the STED stack.
+        :param concofal_end: A confocal image acquired after the STED stack.
+        :param sted_fg: A background mask of the first STED image in the stack
+                        (2d array of bool: True on foreground, False on background).
+        :param confocal_fg: A background mask of the initial confocal image
+                            (2d array of bool: True on foreground, False on background).
+
+        :returns: :math:`0` if no STED foreground, or the average normalized spatial
+                  frequency of the foreground otherwise.
+        """
+        return self.evaluate_context(AcquisitionContext(sted_stack, confocal_init, confocal_end, sted_fg, confocal_fg))
+
+    def evaluate_context(self, context):
+        spatialfreqs = context.get(("resolution_map", self.pixelsize, self.tile_size, self.step), fsc.resolution_map,
+                                   context.sted_image(), self.pixelsize, self.tile_size, self.step, self.n_workers)
+        weights = fsc.tile_images(context.sted_fg, self.tile_size, self.step).mean(axis=(-2, -1))
+        if weights.sum() == 0:
+            return 0
+        return numpy.sum(weights * spatialfreqs) / weights.sum() / self.max_spatialfreq
+
     def mirror_ticks(self, ticks):
         return ["{:0.0f}".format(1e+3 / (self.max_spatialfreq * x)) if x > 0 else "" for x in ticks]
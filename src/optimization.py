@@ -1,6 +1,7 @@
 
 """The module :mod:`optimization` contains the class :class:`optimization.Optimizer`
-that allows the user to create the optimization routine.
+that allows the user to create the optimization routine, and the class
+:class:`optimization.StoppingController` that monitors its convergence.
 """
 
 import shutil
@@ -13,6 +14,8 @@ import numpy
 
 import skimage.io
 
+from scipy.stats import norm
+
 import yaml
 
 import algorithms
@@ -22,6 +25,7 @@ import objectives
 import user
 import utils
 
+from space import ParameterSpace, AdaptiveGrid
 from virtual import QualityNet, PrefNet
 
 
@@ -33,10 +37,117 @@ def sort_objectives(obj):
 
     :returns : The list of objectives name in the priority order.
     """
-    priority = ['Quality', 'Quality_Last', 'Bleach', 'Autocorrelation', 'FRC', 'FWHM', 'Signal_Ratio']
+    priority = ['Quality', 'Quality_Last', 'Bleach', 'Autocorrelation', 'FRC', 'FRC_Map', 'FWHM', 'Signal_Ratio']
     return [item for item in priority if item in obj]
 
 
+class StoppingController:
+    """Monitors the convergence of the regression models of an optimization on a fixed
+    low-discrepancy subset of the parameter space (see :func:`utils.quasi_random_grid`).
+    After every update of the models, it computes
+
+    * *variance*: the maximal posterior variance, relative to the prior variance, over the
+      objectives and the probed parameters;
+    * *stability*: the Jaccard index between the probed parameters whose posterior means are
+      non-dominated (the predicted optimum) and those of the previous update;
+    * *improvement*: the maximal expected improvement of the posterior mean of an objective
+      over its predicted optimum, relative to the scale of the observations.
+
+    The optimization is converged once the predicted optimum is stable, the expected
+    improvement is small and, with a *variance* threshold, the posterior variance is small
+    for *patience* consecutive updates, i.e. when further acquisitions are unlikely to change
+    the chosen parameters.
+
+    :param objectives: A list of the objectives (see :attr:`objectives.Objective.maximize`).
+    :param space: The :class:`space.ParameterSpace` of the optimization.
+    :param patience: The number of consecutive converged updates (default: 3).
+    :param improvement: The maximal relative expected improvement of a converged update
+                        (default: 0.05).
+    :param stability: The minimal stability of a converged update (default: 0.9).
+    :param variance: The maximal variance of a converged update (default: None, the
+                     variance is not a criterion).
+    :param auto: If True, the optimization stops on its own once converged (default: False).
+    :param n_probes: The number of probed parameters (default: 1024).
+    """
+    def __init__(self, objectives, space, patience=3, improvement=5e-2, stability=0.9, variance=None,
+                 auto=False, n_probes=1024):
+        self.patience = patience
+        self.improvement = improvement
+        self.stability = stability
+        self.variance = variance
+        self.auto = auto
+        self.maximize = [obj.maximize for obj in objectives]
+        self.probes = utils.quasi_random_grid(space.axes, n_probes)
+        self.front = None
+        self.settled = 0
+
+    @property
+    def converged(self):
+        """Whether the last *patience* updates were converged."""
+        return self.settled >= self.patience
+
+    @property
+    def stop(self):
+        """Whether the optimization should stop on its own."""
+        return self.auto and self.converged
+
+    def state(self):
+        """Returns the state of the controller, to be saved with the checkpoints of the
+        models (see :func:`customio.save_checkpoint`).
+
+        :return: A dict of metadata and a dict of arrays.
+        """
+        meta = {"settled": int(self.settled),
+                "front": None if self.front is None else sorted(int(i) for i in self.front)}
+        return meta, {"probes": self.probes}
+
+    def load_state(self, meta, arrays):
+        """Restores a state returned by :func:`state`, so that a resumed optimization keeps
+        the number of consecutive converged updates and the probed parameters.
+
+        :param meta: A dict of metadata.
+        :param arrays: A dict of arrays.
+        """
+        if arrays["probes"].shape[1] != self.probes.shape[1]:
+            return
+        self.probes = numpy.array(arrays["probes"])
+        self.settled = meta["settled"]
+        self.front = None if meta["front"] is None else set(meta["front"])
+
+    def update(self, model):
+        """Computes the convergence metrics of the updated models.
+
+        :param model: The :class:`algorithms.Kernel_TS_MultiObjective` of the optimization,
+                      updated at least once.
+
+        :return: The variance, the stability and the improvement of this update.
+        """
+        means, stds = model.predict(self.probes)
+        variance, improvement = 0, 0
+        for algo, mean, std, maximize in zip(model.algos, means, stds, self.maximize):
+            _, X, y = algo.regression_data()
+            counts, m2 = algo.regression_weights()
+            scale = algorithms.normalize(y, counts, m2)[2]
+            variance = max(variance, numpy.max((std / (algo.s_ub / numpy.sqrt(algo.lambda_) * scale))**2))
+            # expected improvement over the best posterior mean
+            gain = mean if maximize else -mean
+            gap = gain - numpy.max(gain)
+            z = gap / numpy.maximum(std, 1e-12)
+            ei = gap * norm.cdf(z) + std * norm.pdf(z)
+            improvement = max(improvement, numpy.max(ei) / scale)
+
+        front = set(utils.pareto_front(means.T, self.maximize).tolist())
+        stability = 0 if self.front is None else len(front & self.front) / len(front | self.front)
+        self.front = front
+
+        if (stability >= self.stability and improvement <= self.improvement and
+                (self.variance is None or variance <= self.variance)):
+            self.settled += 1
+        else:
+            self.settled = 0
+        return variance, stability, improvement
+
+
 class Optimizer:
     """This is the :class:`Optimizer` to run an optimization of the given parameters
     for the given objectives. The optimization uses the :class:`Kernel_TS` from
@@ -71,11 +182,51 @@ class Optimizer:
         self.noise_ub_objectives = self.config["noise_ub_objectives"]
         self.with_time = self.config["with_time"]
         self.pseudo_points = self.config["pseudo_points"]
+        self.sampler = self.config.get("sampler", "dense")
+        self.n_features = self.config.get("n_features", 1000)
+        self.n_inducing = self.config.get("n_inducing", 0)
+        self.aggregate = self.config.get("aggregate", False)
+        if self.pseudo_points and self.n_inducing > 0:
+            print("WARNING: Disabling pseudo points because they are not supported by the sparse model!")
+            self.pseudo_points = False
+        self.n_candidates = self.config.get("n_candidates", 0)
+        self.candidates = self.config.get("candidates", "sobol")
+        self.batch = self.config.get("batch", False)
+        self.pareto_front = self.config.get("pareto_front", False)
+        self.cost_aware = self.config.get("cost_aware", False)
+        self.coarse_size = self.config.get("coarse_size", 0)
+        self.stopping = self.config.get("stopping", {})
+        self.n_refine = self.config.get("n_refine", 3)
+        self.frc_stack = self.config.get("frc_stack", {})
+        self.checkpoint_every = self.config.get("checkpoint_every", 10)
+        self.checkpoint_t = None
+        if (self.n_candidates > 0 or self.coarse_size > 0) and self.sampler == "kronecker":
+            print("WARNING: Using the fourier sampler because the kronecker sampler needs the whole parameter space!")
+            self.sampler = "fourier"
         self.previous = self.config["output"]["previous"]
+        self.resume = self.config["output"].get("resume")
+        if self.resume is not None:
+            with open(os.path.join(self.resume, "config"), "r") as f:
+                resume_config = yaml.safe_load(f)
+            assert (resume_config["params"] == self.params_name and resume_config["objectives"] == self.objectives_name),\
+                "Checkpoints can only be resumed for same params and objectives."
         self.output = self.create_output_dir()
 
         # initialize objectives, parameters space, and pre-train algorithms on previous knowledge
-        self.objectives, self.space, self.algos = self.configure_optimization()
+        self.objectives, self.space, self.model = self.configure_optimization()
+        self.algos = self.model.algos
+        self.cost_model = self.configure_cost()
+        self.controller = StoppingController(self.objectives, self.space, **self.stopping)
+        if self.resume is not None:
+            customio.load_checkpoint(self.resume, controller=self.controller)
+        self.grid = None
+        if self.coarse_size > 0:
+            self.grid = AdaptiveGrid(self.space, self.coarse_size)
+            if self.algos[0].X is not None:
+                # refine around the observed parameters down to the finest resolution
+                for _ in range(self.grid.max_level):
+                    self.refine_grid(self.algos[0].X)
+        self.checkpoint(self.t, force=True)
         
         if len(self.objectives) > 2 and self.with_time:
             print("WARNING: Disabling time objective because you have more than two objectives!")
@@ -93,81 +244,64 @@ class Optimizer:
         are updated with the new knowledge. A regression of the current data is
         done and the images are saved in the output folder.
 
+        With *batch* in the configuration, the parameters of every region are selected
+        before the first acquisition (see :func:`propose_batch`), the acquisitions run
+        back-to-back and the algorithms are updated once at the end.
+
+        The measured duration of every STED acquisition is saved and updates the model of
+        the acquisition times (see :func:`configure_cost`).
+
+        With *coarse_size* in the configuration, the options are sampled on an adaptive grid
+        that is refined after every update of the algorithms (see :func:`refine_grid`).
+
+        The models are checkpointed every *checkpoint_every* acquisitions and at the end of
+        the run (see :func:`checkpoint`).
+
+        The convergence is checked after every update of the algorithms (see
+        :func:`check_convergence`). With *auto* in the *stopping* configuration, the
+        remaining regions are skipped once converged. The decision is logged at the end.
+
+        With *enabled* in the *frc_stack* configuration, the FRC objective is also computed
+        on every image of the STED stack at every step (see :func:`save_frc`).
+
         :param readjust: Boolean, wheter or not to readjust focus between the first
                          confocal and the STED image.
         """
         linestep = microscope.get_linestep(self.config_sted, self.config["params_set"]["Line_Step"])
-        if self.with_time:
-            idx = self.params_name.index("Dwelltime")
-            timesperpixel = linestep * self.space[:, idx]
-        else:
-            timesperpixel = linestep * microscope.get_dwelltime(self.config_sted)
 
         regions = user.get_regions()
-        for (x, y) in regions:
+        if self.batch:
+            proposals = self.propose_batch(len(regions), linestep)
+            batch_X, batch_y = [], []
+        for k, (x, y) in enumerate(regions):
+            if self.controller.stop:
+                print("Skipping the remaining regions because the optimization has converged.")
+                break
             microscope.set_offsets(self.config_conf, x, y)
             microscope.set_offsets(self.config_sted, x, y)
 
             # acquire a confocal image
-            stacks, _ = microscope.acquire(self.config_conf)
-            cimg1 = stacks[0][0]
-            if len(stacks) > 1:
-                cimg1_others = [stack[0] for stack in stacks[1:]]
-            else:
-                cimg1_others = []
+            cimg1, cimg1_others = self.acquire_confocal()
 
             # readjust focus is needed
             if readjust:
                 input("Manually adjust the focus in the overview window then press enter.")
                 # reacquire the confocal image
-                stacks, _ = microscope.acquire(self.config_conf)
-                cimg1 = stacks[0][0]
+                cimg1, _ = self.acquire_confocal()
             readjust = False
 
-            o_t = [algo.sample(self.space) for algo in self.algos]
-
-            if self.autopref:
-                if self.with_time:
-                    i_t = self.prefnet.predict(numpy.hstack((numpy.array(o_t).T, timesperpixel[:, None])))
-                else:
-                    i_t = self.prefnet.predict(numpy.array(o_t).T)
-                i_t_fla = -1
-                # i_t_fla = user.select(o_t, self.objectives, self.with_time, timesperpixel) # for debug
+            if self.batch:
+                proposal = proposals[k]
             else:
-                if len(self.objectives) > 1:
-                    i_t = user.select(o_t, self.objectives, self.with_time, timesperpixel)
-                else:
-                    i_t = self.objectives[0].select_optimal(o_t)
-                i_t_fla = i_t
-
-            p_t = self.space[i_t]
+                proposal = self.propose(self.model, linestep)
+            p_t = proposal["params"]
             print("Selected parameters", p_t)
 
             # acquire a STED stack using the selected parameter(s)
-            for label, value in zip(self.params_name, p_t):
-               # using .item() to convert from Numpy type to standard Python type
-                self.params_set[label](self.config_sted, value.item())
-            stacks, _ = microscope.acquire(self.config_sted)
-            sted_stack = stacks[0]
-            if len(stacks) > 1:
-                sted_stack_others = stacks[1:]
-            else:
-                sted_stack_others = []
-
-            # foreground on confocal image
-            fg_c = utils.get_foreground(cimg1)
-            # foreground on sted image
-            fg_s = utils.get_foreground(sted_stack[0])
-            # remove STED foreground points not in confocal foreground, if any
-            fg_s *= fg_c
+            sted_stack, sted_stack_others, duration = self.acquire_sted(p_t)
 
             # acquire a confocal in the end
-            stacks, _ = microscope.acquire(self.config_conf)
-            cimg2 = stacks[0][0]
-            if len(stacks) > 1:
-                cimg2_others = [stack[0] for stack in stacks[1:]]
-            else:
-                cimg2_others = []
+            cimg2, cimg2_others = self.acquire_confocal()
 
             if self.thrash_data:
                 answer = input("Do you want to keep data? (y/n)")
@@ -179,61 +313,258 @@ class Optimizer:
                     continue
 
             # evaluating the objectives
-            r_t = [obj.evaluate(sted_stack, cimg1, cimg2, fg_s, fg_c) for obj in self.objectives]
+            # the foregrounds and the other shared quantities are computed on demand
+            context = objectives.AcquisitionContext(sted_stack, cimg1, cimg2)
+            r_t = [obj.evaluate_context(context) for obj in self.objectives]
             if None in r_t:
                 print("TRASHING DATA: None value in rewards!", r_t)
                 continue
+            self.cost_model.update([p_t], self.cost_targets([p_t], [duration]))
 
-            for algo, reward in zip(self.algos, r_t):
-                algo.update([p_t], [reward])
-
-            with warnings.catch_warnings():
-                # ignore low-contrast image warnings
-                warnings.simplefilter("ignore")
-                skimage.io.imsave(os.path.join(self.output, "Confocal1", "{}.tiff".format(self.t)), cimg1)
-                skimage.io.imsave(os.path.join(self.output, "Confocal2", "{}.tiff".format(self.t)), cimg2)
-                if len(sted_stack) > 1:
-                    for i, img, in enumerate(sted_stack):
-                        skimage.io.imsave(os.path.join(self.output, "STED", "{}_{}.tiff".format(i, self.t)), img)
-                else:
-                    skimage.io.imsave(os.path.join(self.output, "STED", "{}.tiff".format(self.t)), sted_stack[0])
-
-                for i, img in enumerate(cimg1_others):
-                    skimage.io.imsave(os.path.join(self.output, "Confocal1_Others", "{}_{}.tiff".format(i, self.t)), img)
-                for i, img in enumerate(cimg2_others):
-                    skimage.io.imsave(os.path.join(self.output, "Confocal2_Others", "{}_{}.tiff".format(i, self.t)), img)
-                for i, stack in enumerate(sted_stack_others):
-                    if len(stack) > 1:
-                        for j, img, in enumerate(stack):
-                            skimage.io.imsave(os.path.join(self.output, "STED_Others", "{}_{}_{}.tiff".format(i, j, self.t)), img)
-                    else:
-                        skimage.io.imsave(os.path.join(self.output, "STED_Others", "{}_{}.tiff".format(i, self.t)), stack[0])
-
-            # for plotting regression in multi-parameters optimization
-            if len(self.params_name) > 1:
-                for i, param_label in enumerate(self.params_name):
-                    X_pred = numpy.empty((len(self.params_space[param_label]), len(self.params_name)))
-                    X_pred[:, i] = self.params_space[param_label]
-                    for j, value in enumerate(p_t):
-                        if j != i:
-                            X_pred[:, j] = value
-                    utils.plot_regression(self.objectives, self.algos, X_pred, i, param_label, self.output, self.t)
+            if self.batch:
+                batch_X.append(p_t)
+                batch_y.append(r_t)
             else:
-                utils.plot_regression(self.objectives, self.algos, self.space, 0, self.params_name[0], self.outptut, self.t)
-
-            with open(os.path.join(self.output, "X"), "a") as f:
-                f.write("{},{}\n".format(self.t, ",".join(map(str, p_t))))
-            with open(os.path.join(self.output, "y"), "a") as f:
-                f.write("{},{}\n".format(self.t, ",".join(map(str, r_t))))
-            with open(os.path.join(self.output, "Options", "choices"), "a") as f:
-                f.write("{},{},{}\n".format(self.t, i_t, i_t_fla))
+                self.model.update([p_t], [r_t])
+                self.checkpoint(self.t + 1)
+                if self.grid is not None:
+                    self.refine_grid()
+                self.check_convergence(self.t + 1)
+                self.plot_regressions(p_t, self.t)
+
+            self.save_images(cimg1, cimg2, sted_stack, cimg1_others, cimg2_others, sted_stack_others)
+            if self.frc_stack.get("enabled", False):
+                self.save_frc(sted_stack, sted_stack_others, context)
+            self.save_step(proposal, r_t, duration)
+
+            self.t += 1
+
+        if self.batch and len(batch_X) > 0:
+            self.model.update(batch_X, batch_y)
+            self.checkpoint(self.t)
+            if self.grid is not None:
+                self.refine_grid()
+            self.check_convergence(self.t)
+            self.plot_regressions(batch_X[-1], self.t - 1)
+
+        self.checkpoint(self.t, force=True)
+
+        # log the stopping decision of this run
+        with open(os.path.join(self.output, "stopping"), "a") as f:
+            f.write("{},{:d},{:d}\n".format(self.t, self.controller.converged, self.controller.stop))
+
+    def propose(self, model, linestep):
+        """Samples the options of the candidates of this step with the given model and
+        selects the parameters to acquire, by the user, the PrefNet or the optimal option
+        of a single objective. With *pareto_front* in the configuration, only the
+        non-dominated options (see :func:`utils.pareto_front`) are presented, according to
+        the :func:`select_optimal` of every objective and to the time if considered.
+
+        With *cost_aware* in the configuration, the option maximizing the information gained
+        on the objectives (see :func:`algorithms.Kernel_TS_MultiObjective.information_gain`)
+        per second of predicted acquisition time (see :func:`predict_cost`) is selected, for
+        any number of objectives. The selection is restricted to the options that are
+        non-dominated according to the sampled objectives only, the time being weighed by
+        the rates, so that a cheap option is never selected over a better one sampled as
+        informative.
+
+        :param model: The :class:`algorithms.Kernel_TS_MultiObjective` to sample from.
+        :param linestep: The line step of the STED configuration.
+
+        :return: A dict of the selected parameters (*params*), the candidates (*space*),
+                 the indices of the presented options in the candidates (*front*), the
+                 presented options (*options*) and their times per pixel (*times*), the
+                 information per second of the presented options (*rates*, only if
+                 *cost_aware*), and the indices of the choice in the presented options
+                 (*choice* and *choice_fla*).
+        """
+        space = self.get_candidates()
+        if self.with_time:
+            idx = self.params_name.index("Dwelltime")
+            timesperpixel = linestep * space[:, idx]
+        else:
+            timesperpixel = linestep * microscope.get_dwelltime(self.config_sted)
+
+        samples = model.sample(space)
+
+        # only the non-dominated options are presented
+        o_t = samples
+        if self.pareto_front or self.cost_aware:
+            points, maximize = o_t.T, [obj.maximize for obj in self.objectives]
+            if self.with_time and not self.cost_aware:
+                points, maximize = numpy.hstack((points, timesperpixel[:, None])), maximize + [False]
+            front = utils.pareto_front(points, maximize)
+            o_t = o_t[:, front]
+            if self.with_time:
+                timesperpixel = timesperpixel[front]
+        else:
+            front = numpy.arange(o_t.shape[1])
+
+        rates = None
+        if self.cost_aware:
+            # the most informative non-dominated option per second of acquisition
+            options = space[front]
+            rates = model.information_gain(options) / self.predict_cost(options)
+            i_t = int(numpy.argmax(rates))
+            i_t_fla = i_t
+        elif self.autopref:
             if self.with_time:
-                options = numpy.hstack((numpy.array(o_t).T, timesperpixel[:, None]))
+                i_t = self.prefnet.predict(numpy.hstack((numpy.array(o_t).T, timesperpixel[:, None])))
             else:
-                options = numpy.array(o_t).T
-            numpy.savetxt(os.path.join(self.output, "Options", str(self.t)), options, delimiter=",")
+                i_t = self.prefnet.predict(numpy.array(o_t).T)
+            i_t_fla = -1
+            # i_t_fla = user.select(o_t, self.objectives, self.with_time, timesperpixel) # for debug
+        else:
+            if len(self.objectives) > 1:
+                i_t = user.select(o_t, self.objectives, self.with_time, timesperpixel)
+            else:
+                i_t = self.objectives[0].select_optimal(o_t)
+            i_t_fla = i_t
 
-            self.t += 1
+        return {"params": space[front[i_t]], "space": space, "front": front, "options": o_t,
+                "times": timesperpixel, "rates": rates, "choice": i_t, "choice_fla": i_t_fla}
+
+    def propose_batch(self, n, linestep):
+        """Selects the parameters of *n* regions before any acquisition. After every
+        selection, the posterior means at the selected parameters are hallucinated as
+        observations (kriging believer, see :func:`algorithms.Kernel_TS_MultiObjective.believe`),
+        so that the next options are sampled given the pending acquisitions and the
+        selected parameters are diverse. The model of the optimization is not modified.
+
+        :param int n: The number of regions.
+        :param linestep: The line step of the STED configuration.
+
+        :return: A list of *n* proposals, as returned by :func:`propose`.
+        """
+        proposals = []
+        model = self.model
+        for k in range(n):
+            proposals.append(self.propose(model, linestep))
+            if k < n - 1:
+                model = model.believe([proposals[-1]["params"]])
+        return proposals
+
+    def acquire_confocal(self):
+        """Acquires a confocal image.
+
+        :return: The confocal image and a list of the images of the other channels.
+        """
+        stacks, _ = microscope.acquire(self.config_conf)
+        if len(stacks) > 1:
+            return stacks[0][0], [stack[0] for stack in stacks[1:]]
+        return stacks[0][0], []
+
+    def acquire_sted(self, p_t):
+        """Acquires a STED stack using the selected parameters.
+
+        :param p_t: A 1-D array of the selected parameters.
+
+        :return: The STED stack, a list of the stacks of the other channels and the
+                 measured acquisition time (seconds).
+        """
+        for label, value in zip(self.params_name, p_t):
+           # using .item() to convert from Numpy type to standard Python type
+            self.params_set[label](self.config_sted, value.item())
+        stacks, duration = microscope.acquire(self.config_sted)
+        return stacks[0], stacks[1:], duration
+
+    def save_images(self, cimg1, cimg2, sted_stack, cimg1_others, cimg2_others, sted_stack_others):
+        """Saves the images acquired at this step in the output folder.
+
+        :param cimg1: The first confocal image.
+        :param cimg2: The last confocal image.
+        :param sted_stack: The STED stack.
+        :param cimg1_others: A list of the first confocal images of the other channels.
+        :param cimg2_others: A list of the last confocal images of the other channels.
+        :param sted_stack_others: A list of the STED stacks of the other channels.
+        """
+        with warnings.catch_warnings():
+            # ignore low-contrast image warnings
+            warnings.simplefilter("ignore")
+            skimage.io.imsave(os.path.join(self.output, "Confocal1", "{}.tiff".format(self.t)), cimg1)
+            skimage.io.imsave(os.path.join(self.output, "Confocal2", "{}.tiff".format(self.t)), cimg2)
+            if len(sted_stack) > 1:
+                for i, img, in enumerate(sted_stack):
+                    skimage.io.imsave(os.path.join(self.output, "STED", "{}_{}.tiff".format(i, self.t)), img)
+            else:
+                skimage.io.imsave(os.path.join(self.output, "STED", "{}.tiff".format(self.t)), sted_stack[0])
+
+            for i, img in enumerate(cimg1_others):
+                skimage.io.imsave(os.path.join(self.output, "Confocal1_Others", "{}_{}.tiff".format(i, self.t)), img)
+            for i, img in enumerate(cimg2_others):
+                skimage.io.imsave(os.path.join(self.output, "Confocal2_Others", "{}_{}.tiff".format(i, self.t)), img)
+            for i, stack in enumerate(sted_stack_others):
+                if len(stack) > 1:
+                    for j, img, in enumerate(stack):
+                        skimage.io.imsave(os.path.join(self.output, "STED_Others", "{}_{}_{}.tiff".format(i, j, self.t)), img)
+                else:
+                    skimage.io.imsave(os.path.join(self.output, "STED_Others", "{}_{}.tiff".format(i, self.t)), stack[0])
+
+    def save_frc(self, sted_stack, sted_stack_others, context=None):
+        """Computes the FRC objective on every image of the STED stack, and of the STED
+        stacks of the other channels with *others* in the *frc_stack* configuration, in a
+        single batch (see :func:`objectives.FRC.evaluate_stacks`). The values are saved in
+        the output folder, one line per stack, to follow the resolution along the stack.
+
+        :param sted_stack: The STED stack.
+        :param sted_stack_others: A list of the STED stacks of the other channels.
+        :param context: The :class:`objectives.AcquisitionContext` of the STED stack, whose
+                        FRC of the first image is reused (default: None).
+        """
+        stacks = [sted_stack]
+        if self.frc_stack.get("others", False):
+            stacks.extend(sted_stack_others)
+        frcs = self.avail_objectives["FRC"].evaluate_stacks(stacks, context)
+        with open(os.path.join(self.output, "FRC", str(self.t)), "w") as f:
+            for frc in frcs:
+                f.write("{}\n".format(",".join(map(str, frc))))
+
+    def save_step(self, proposal, r_t, duration):
+        """Saves the selected parameters, the evaluated objectives, the acquisition time
+        and the options of this step in the output folder. Only the presented options are
+        saved, so that the choices index their rows, along with their indices in the
+        candidates when only the non-dominated options are presented (see :func:`propose`)
+        and their parameters when the candidates change at every step.
+
+        :param proposal: The proposal of this step, as returned by :func:`propose`.
+        :param r_t: A list of the evaluated objectives.
+        :param duration: The measured time of the STED acquisition (seconds).
+        """
+        with open(os.path.join(self.output, "X"), "a") as f:
+            f.write("{},{}\n".format(self.t, ",".join(map(str, proposal["params"]))))
+        with open(os.path.join(self.output, "y"), "a") as f:
+            f.write("{},{}\n".format(self.t, ",".join(map(str, r_t))))
+        with open(os.path.join(self.output, "times"), "a") as f:
+            f.write("{},{}\n".format(self.t, duration))
+        with open(os.path.join(self.output, "Options", "choices"), "a") as f:
+            f.write("{},{},{}\n".format(self.t, proposal["choice"], proposal["choice_fla"]))
+        if self.with_time:
+            options = numpy.hstack((numpy.array(proposal["options"]).T, proposal["times"][:, None]))
+        else:
+            options = numpy.array(proposal["options"]).T
+        numpy.savetxt(os.path.join(self.output, "Options", str(self.t)), options, delimiter=",")
+        if self.pareto_front or self.cost_aware:
+            # the presented options are the candidates at these indices
+            numpy.savetxt(os.path.join(self.output, "Options", "{}_front".format(self.t)),
+                          proposal["front"], fmt="%d", delimiter=",")
+        if proposal["rates"] is not None:
+            numpy.savetxt(os.path.join(self.output, "Options", "{}_rates".format(self.t)),
+                          proposal["rates"], delimiter=",")
+        if self.n_candidates > 0 or self.grid is not None:
+            # the candidates of this step are not the parameter space
+            numpy.savetxt(os.path.join(self.output, "Options", "{}_candidates".format(self.t)),
+                          proposal["space"][proposal["front"]], delimiter=",")
+
+    def plot_regressions(self, p_t, t):
+        """Plots the regression of every objective along every parameter, through the
+        selected parameters.
+
+        :param p_t: A 1-D array of the selected parameters.
+        :param t: The time of the optimization.
+        """
+        for i, param_label in enumerate(self.params_name):
+            X_pred = self.space.line(i, p_t)
+            utils.plot_regression(self.objectives, self.algos, X_pred, i, param_label, self.output, t)
 
     def create_output_dir(self):
         """Creates every saving folder and also saves the important configuration
@@ -243,18 +574,23 @@ class Optimizer:
         """
         output = os.path.join(
             self.config["output"]["saving_dir"], self.config["output"]["folder"])
+        # resuming in the same folder continues the previous optimization
+        resuming = self.resume is not None and os.path.realpath(self.resume) == os.path.realpath(output)
         # creates every folders to save the future results
         try:
-            os.makedirs(output, exist_ok=False)
-            os.makedirs(os.path.join(output, "Confocal1"), exist_ok=False)
-            os.makedirs(os.path.join(output, "Confocal2"), exist_ok=False)
-            os.makedirs(os.path.join(output, "STED"), exist_ok=False)
-            os.makedirs(os.path.join(output, "Confocal1_Others"), exist_ok=False)
-            os.makedirs(os.path.join(output, "Confocal2_Others"), exist_ok=False)
-            os.makedirs(os.path.join(output, "STED_Others"), exist_ok=False)
-            os.makedirs(os.path.join(output, "Regression"), exist_ok=False)
+            os.makedirs(output, exist_ok=resuming)
+            os.makedirs(os.path.join(output, "Confocal1"), exist_ok=resuming)
+            os.makedirs(os.path.join(output, "Confocal2"), exist_ok=resuming)
+            os.makedirs(os.path.join(output, "STED"), exist_ok=resuming)
+            os.makedirs(os.path.join(output, "Confocal1_Others"), exist_ok=resuming)
+            os.makedirs(os.path.join(output, "Confocal2_Others"), exist_ok=resuming)
+            os.makedirs(os.path.join(output, "STED_Others"), exist_ok=resuming)
+            os.makedirs(os.path.join(output, "Regression"), exist_ok=resuming)
             # for storing options (tradeoffs) presented to the user
-            os.makedirs(os.path.join(output, "Options"), exist_ok=False)
+            os.makedirs(os.path.join(output, "Options"), exist_ok=resuming)
+            if self.frc_stack.get("enabled", False):
+                # for storing the FRC of every image of the STED stacks
+                os.makedirs(os.path.join(output, "FRC"), exist_ok=resuming)
         # to avoid overwriting previous optimization
         except OSError as err:
             print("The folder already exists. Consider changing the name of the saving directory.")
@@ -273,7 +609,22 @@ class Optimizer:
                       "space": {p: self.params_space[p].tolist() for p in self.params_name},
                       "objectives": self.objectives_name,
                       "with_time": self.with_time,
-                      "pseudo_points": self.pseudo_points}
+                      "pseudo_points": self.pseudo_points,
+                      "sampler": self.sampler,
+                      "n_features": self.n_features,
+                      "n_inducing": self.n_inducing,
+                      "aggregate": self.aggregate,
+                      "n_candidates": self.n_candidates,
+                      "candidates": self.candidates,
+                      "batch": self.batch,
+                      "pareto_front": self.pareto_front,
+                      "cost_aware": self.cost_aware,
+                      "coarse_size": self.coarse_size,
+                      "n_refine": self.n_refine,
+                      "stopping": self.stopping,
+                      "frc_stack": self.frc_stack,
+                      "checkpoint_every": self.checkpoint_every,
+                      "frc_map": self.config.get("frc_map", {})}
             yaml.dump(config, f)
 
         # saving the microscope confocal configuration
@@ -288,6 +639,133 @@ class Optimizer:
 
         return output
 
+    def get_candidates(self):
+        """Returns the options to sample at this step. If *coarse_size* is set in the
+        configuration, the active points of the adaptive grid are used (see
+        :func:`refine_grid`). If *n_candidates* is set, a fresh low-discrepancy subset of
+        the parameter space is drawn (see :func:`utils.quasi_random_grid`). Otherwise the
+        whole parameter space is used.
+
+        :return: A 2d array of candidate parameters, one per row, or the
+                 :class:`space.ParameterSpace`.
+        """
+        if self.grid is not None:
+            return self.grid.points()
+        if self.n_candidates > 0:
+            return utils.quasi_random_grid(self.space.axes, self.n_candidates, self.candidates)
+        return self.space
+
+    def get_dwelltimes(self, X):
+        """Returns the pixel dwell time of the given parameters, which is the parameter
+        *Dwelltime* if optimized or the dwell time of the STED configuration otherwise.
+
+        :param X: A 2d array of parameters, one per row.
+
+        :return: A 1-D array of dwell times (seconds).
+        """
+        if "Dwelltime" in self.params_name:
+            return numpy.asarray(X, dtype=float)[:, self.params_name.index("Dwelltime")]
+        return numpy.full(len(X), microscope.get_dwelltime(self.config_sted))
+
+    def cost_targets(self, X, durations):
+        """Returns the observations of the model of the acquisition times, i.e. the log
+        of the measured durations divided by the dwell times (see :func:`get_dwelltimes`).
+        The model only has to learn the number of pixels and the overheads, so that the
+        predicted times are proportional to the dwell times until any time is measured.
+
+        :param X: A 2d array of parameters, one per row.
+        :param durations: A 1-D array of measured acquisition times (seconds).
+
+        :return: A 1-D array of observations.
+        """
+        return numpy.log(numpy.asarray(durations, dtype=float) / self.get_dwelltimes(X))
+
+    def predict_cost(self, X):
+        """Predicts the time of a STED acquisition with the given parameters.
+
+        :param X: A 2d array of parameters, one per row.
+
+        :return: A 1-D array of predicted acquisition times (seconds, up to a constant
+                 factor before the first measured time).
+        """
+        mean, _ = self.cost_model.predict(X)
+        return self.get_dwelltimes(X) * numpy.exp(mean)
+
+    def configure_cost(self):
+        """Creates the regression model of the acquisition times over the parameter space
+        (see :func:`cost_targets`), and trains it on the times saved by the previous
+        optimizations and by the resumed optimization, if any. When resuming, the model is
+        restored from the checkpoint, which holds the times of every optimization it was
+        trained on, and only the times saved after the checkpoint are replayed.
+
+        :return: A :class:`algorithms.Kernel_TS`.
+        """
+        # the noise is on the log of the times, i.e. relative
+        cost_model = algorithms.Kernel_TS(self.algos[0].bandwidth, 1e-3, 1.0, aggregate=self.aggregate)
+        paths, start = list(self.previous) + [self.resume], 0
+        if self.resume is not None:
+            t = customio.load_checkpoint(self.resume, cost_model=cost_model)
+            if cost_model.X is not None:
+                paths, start = [self.resume], t
+        for path in paths:
+            if path is not None and os.path.isfile(os.path.join(path, "times")):
+                prev_X, prev_times = customio.read_previous_results(path, self.params_name, y_filename="times",
+                                                                    start=start if path == self.resume else 0)
+                if prev_X.shape[0] > 0:
+                    cost_model.update(prev_X, self.cost_targets(prev_X, prev_times[:, 0]))
+        return cost_model
+
+    def checkpoint(self, t, force=False):
+        """Saves a checkpoint of the models, of the controller of their convergence and of
+        the model of the acquisition times (see :func:`customio.save_checkpoint`) every
+        *checkpoint_every* acquisitions, or at once with *force*. The acquisitions after the
+        last checkpoint are replayed from the output folder when resuming (see
+        :func:`configure_optimization`).
+
+        :param t: The time of the optimization.
+        :param force: If True, saves the checkpoint whatever the time (default: False).
+        """
+        if (force or t % self.checkpoint_every == 0) and t != self.checkpoint_t:
+            customio.save_checkpoint(self.output, self.model, t, self.controller, self.cost_model)
+            self.checkpoint_t = t
+
+    def check_convergence(self, t):
+        """Updates the convergence metrics (see :class:`StoppingController`) and saves them
+        in the output folder, with the number of consecutive converged updates. A message
+        is printed when the optimization converges.
+
+        :param t: The time of the optimization after the update.
+        """
+        converged = self.controller.converged
+        variance, stability, improvement = self.controller.update(self.model)
+        with open(os.path.join(self.output, "convergence"), "a") as f:
+            f.write("{},{},{},{},{}\n".format(t, variance, stability, improvement, self.controller.settled))
+        if self.controller.converged and not converged:
+            print("The optimization has converged: further acquisitions are unlikely to change the chosen parameters.")
+
+    def refine_grid(self, observed=None):
+        """Refines the adaptive grid (see :class:`space.AdaptiveGrid`). By default, the grid
+        is refined around the active points whose posterior means are non-dominated,
+        according to the direction of every objective (see :attr:`objectives.Objective.maximize`).
+        At most *n_refine* of these points are refined, those with the largest information gain
+        (see :func:`algorithms.Kernel_TS_MultiObjective.information_gain`), so that the active
+        grid stays small. With *observed* parameters, e.g. of the previous knowledge, the grid
+        is instead refined around the active points nearest to the observed parameters.
+
+        :param observed: A 2d array of observed parameters, one per row (default: None).
+
+        :return: The number of activated points.
+        """
+        if observed is not None:
+            return self.grid.refine(self.grid.nearest(observed))
+        X = self.grid.points()
+        means, _ = self.model.predict(X)
+        maximize = [obj.maximize for obj in self.objectives]
+        front = utils.pareto_front(means.T, maximize)
+        if len(front) > self.n_refine:
+            front = front[numpy.argsort(-self.model.information_gain(X[front]), kind="stable")[:self.n_refine]]
+        return self.grid.refine(self.grid.indices[front])
+
     def create_params_space(self):
         """Creates the parameters space with the values from the configuration dict.
 
@@ -327,13 +805,14 @@ class Optimizer:
                             "Autocorrelation": objectives.Autocorrelation(),
                             "FWHM": objectives.FWHM(microscope.get_pixelsize(self.config_sted)[0]),
                             "Bleach": objectives.Bleach(),
-                            "FRC": objectives.FRC(c["FRC"])}
+                            "FRC": objectives.FRC(c["FRC"], self.config.get("frc_stack", {}).get("n_workers", 0)),
+                            "FRC_Map": objectives.FRC_Map(c.get("FRC_Map", c["FRC"]), **self.config.get("frc_map", {}))}
         if self.autoquality:
             avail_objectives["Quality"] = objectives.ScoreNet("Quality", QualityNet(self.config["autoquality"]["IP"], self.config["autoquality"]["port"]))
             avail_objectives["Quality_Last"] = objectives.ScoreNet("Quality", QualityNet(self.config["autoquality"]["IP"], self.config["autoquality"]["port"]))
         else:
             avail_objectives["Quality"] = objectives.Score("Quality")
-            avail_objectives["Quality_Last"] = objectives.Score("Quality", -1)
+            avail_objectives["Quality_Last"] = objectives.Score("Quality", idx=-1)
         return avail_objectives
 
     def configure_optimization(self):
@@ -341,27 +820,53 @@ class Optimizer:
         It creates the dedicated algorithm for every objective and trains the algorithms
         if previous knowledge is given
 
-        :return: The objectives to optimize, the parameter space and the dedicated algorithms
+        :return: The objectives to optimize, the parameter space and the model serving the
+                 dedicated algorithms
         """
         objectives = [self.avail_objectives[obj] for obj in self.objectives_name]
 
-        # create the parameter space
-        grid = numpy.meshgrid(*[self.params_space[p] for p in self.params_name])
-        space = numpy.vstack(map(numpy.ravel, grid)).T
+        # create the parameter space, decoded lazily
+        space = ParameterSpace.from_params_space(self.params_space, self.params_name)
 
         # set bandwidth with rule of thumb
         ratio = len(self.params_name) / 3
         bandwidth = [(self.params_space[p][-1] - self.params_space[p][0]) * ratio
                      for p in self.params_name]
-        if self.pseudo_points:
+        # every objective is observed at the same locations, so they share the kernel factorization
+        n_objectives = len(self.objectives_name)
+        sampling = {"sampler": self.sampler,
+                    "grid": [self.params_space[p] for p in self.params_name],
+                    "n_features": self.n_features,
+                    "aggregate": self.aggregate,
+                    "kernel": algorithms.KernelFactor(bandwidth, max_factors=2*n_objectives)}
+        if self.n_inducing > 0:
+            # sparse regression model for long histories, inducing points on the parameter space
+            inducing = algorithms.inducing_grid(sampling["grid"], self.n_inducing)
+            sampling["kernel"] = algorithms.SparseKernelFactor(bandwidth, inducing, max_factors=2*n_objectives)
+            algos = [algorithms.Kernel_TS_Sparse(bandwidth, 1e-3, self.noise_ub_objectives[obj], **sampling)
+                     for obj in self.objectives_name]
+        elif self.pseudo_points:
             # for adding pseudo-actions
             space_bounds = [(self.params_space[p][0], self.params_space[p][-1])
                             for p in self.params_name]
-            algos = [algorithms.Kernel_TS_PseudoActions(bandwidth, 1e-3, self.noise_ub_objectives[obj], space_bounds)
+            sampling["pseudo_kernel"] = algorithms.KernelFactor(bandwidth, max_factors=n_objectives)
+            algos = [algorithms.Kernel_TS_PseudoActions(bandwidth, 1e-3, self.noise_ub_objectives[obj], space_bounds, **sampling)
                      for obj in self.objectives_name]
         else:
-            algos = [algorithms.Kernel_TS(bandwidth, 1e-3, self.noise_ub_objectives[obj])
+            algos = [algorithms.Kernel_TS(bandwidth, 1e-3, self.noise_ub_objectives[obj], **sampling)
                      for obj in self.objectives_name]
+        model = algorithms.Kernel_TS_MultiObjective(algos)
+
+        # resume from the checkpoint of an optimization, which already contains its previous knowledge
+        if self.resume is not None:
+            self.t = customio.load_checkpoint(self.resume, model)
+            # replay the acquisitions saved after the checkpoint
+            if os.path.isfile(os.path.join(self.resume, "X")):
+                prev_X, prev_y = customio.read_previous_results(self.resume, self.params_name, self.objectives_name, start=self.t)
+                if prev_X.shape[0] > 0:
+                    model.update(prev_X, prev_y)
+                    self.t += prev_X.shape[0]
+            return objectives, space, model
 
         # add previous knowledge
         for path in self.previous:
@@ -369,14 +874,13 @@ class Optimizer:
                 prev_X, prev_y = customio.read_previous_results(path, self.params_name, self.objectives_name)
                 # to handle pseudo-observations around borders
                 with open(os.path.join(path, "config"), "r") as f:
-                    prev_config = yaml.load(f)
+                    prev_config = yaml.safe_load(f)
                     prev_bounds = [(prev_config["space"][p][0], prev_config["space"][p][-1])
                                    for p in prev_config["params"]]
-                for i, algo in enumerate(algos):
-                    try:
-                        algo.update(prev_X, prev_y[:, i], prev_bounds)
-                    except:
-                        print("Error occured while trying to add previous from", path)
-                        exit()
+                try:
+                    model.update(prev_X, prev_y, prev_bounds)
+                except:
+                    print("Error occured while trying to add previous from", path)
+                    exit()
                 self.t += prev_X.shape[0]
-        return objectives, space, algos
+        return objectives, space, model
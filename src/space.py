@@ -0,0 +1,205 @@
+"""The module :mod:`space` contains the class :class:`space.ParameterSpace` that
+represents the Cartesian grid of parameters without materializing it, and the class
+:class:`space.AdaptiveGrid` that selects a coarse-to-fine subset of this grid.
+"""
+
+import numpy
+
+
+class ParameterSpace:
+    """Lazy Cartesian product of parameter values. The points are ordered as the rows
+    of the array built from :func:`numpy.meshgrid` of the *axes*, raveled in C order,
+    but a point is only decoded from its index when it is accessed.
+
+    The space can be indexed like a 2d array of shape (:attr:`size`, :attr:`ndim`) with an
+    integer, a slice or an array of indices, optionally followed by a column index, e.g.
+    `space[i]`, `space[start:stop]` or `space[:, d]`. Only the requested points (or
+    columns) are allocated. It is converted to a dense array by :func:`numpy.asarray`.
+
+    :param axes: A list of 1d arrays of values, one per parameter.
+    :param names: A list of parameter names (default: None).
+    """
+    def __init__(self, axes, names=None):
+        self.axes = [numpy.asarray(axis) for axis in axes]
+        self.names = names
+        self.ndim = len(self.axes)
+        # numpy.meshgrid swaps the first two dimensions ("xy" indexing)
+        self.order = [1, 0] + list(range(2, self.ndim)) if self.ndim > 1 else [0]
+        self.grid_shape = tuple(len(self.axes[d]) for d in self.order)
+        self.size = int(numpy.prod(self.grid_shape))
+
+    @classmethod
+    def from_params_space(cls, params_space, names):
+        """Creates the space of the given parameters.
+
+        :param params_space: A dict of parameter values, as returned by
+                             :func:`optimization.Optimizer.create_params_space`.
+        :param names: A list of the names of the parameters to use.
+
+        :return: A :class:`ParameterSpace`.
+        """
+        return cls([params_space[name] for name in names], names)
+
+    @property
+    def shape(self):
+        """The shape (:attr:`size`, :attr:`ndim`) of the dense space."""
+        return (self.size, self.ndim)
+
+    def __len__(self):
+        return self.size
+
+    def __array__(self, dtype=None, copy=None):
+        return numpy.asarray(self.decode(numpy.arange(self.size)), dtype=dtype)
+
+    def __getitem__(self, key):
+        columns = slice(None)
+        if isinstance(key, tuple):
+            key, columns = key
+        if isinstance(key, slice):
+            indices = numpy.arange(*key.indices(self.size))
+        else:
+            indices = numpy.asarray(key)
+            indices = numpy.where(indices < 0, indices + self.size, indices)
+        return self.decode(indices, columns)
+
+    def decode(self, indices, columns=slice(None)):
+        """Decodes the parameters of the points at given *indices*.
+
+        :param indices: An index or an array of indices.
+        :param columns: The parameter(s) to decode, as an index, a slice or an array of
+                        indices (default: every parameter).
+
+        :return: The parameters, with one row per index and one column per parameter,
+                 or a single column if *columns* is an integer.
+        """
+        multi_index = numpy.unravel_index(indices, self.grid_shape)
+        columns = numpy.arange(self.ndim)[columns]
+        if columns.ndim == 0:
+            return self.axes[columns][multi_index[self.order[columns]]]
+        values = [self.axes[d][multi_index[self.order[d]]] for d in columns]
+        if not values:
+            return numpy.empty(numpy.shape(indices) + (0,))
+        return numpy.stack(values, axis=-1)
+
+    def ravel(self, value_indices):
+        """Computes the indices of the points from the indices of their parameter values.
+
+        :param value_indices: A 2d array of indices in the *axes*, one column per parameter.
+
+        :return: A 1-D array of indices in the space.
+        """
+        value_indices = numpy.asarray(value_indices)
+        return numpy.ravel_multi_index(tuple(value_indices[:, d] for d in self.order), self.grid_shape)
+
+    def unravel(self, indices):
+        """Computes the indices of the parameter values of the points at given *indices*
+        (inverse of :func:`ravel`).
+
+        :param indices: A 1-D array of indices in the space.
+
+        :return: A 2d array of indices in the *axes*, one column per parameter.
+        """
+        multi_index = numpy.unravel_index(indices, self.grid_shape)
+        return numpy.stack([multi_index[self.order[d]] for d in range(self.ndim)], axis=-1)
+
+    def chunks(self, chunk_size):
+        """Iterates over the space in chunks of consecutive points.
+
+        :param int chunk_size: The maximal number of points per chunk.
+
+        :return: A generator of tuples (start index, 2d array of points).
+        """
+        for start in range(0, self.size, chunk_size):
+            yield start, self[start:start + chunk_size]
+
+    def line(self, dim, point):
+        """Creates the subspace where only the parameter *dim* varies, the other parameters
+        being fixed to their values in *point*.
+
+        :param int dim: The index of the varying parameter.
+        :param point: A 1-D array of parameters.
+
+        :return: A :class:`ParameterSpace` with as many points as values of parameter *dim*.
+        """
+        axes = [axis if d == dim else numpy.asarray([value]) for d, (axis, value) in enumerate(zip(self.axes, point))]
+        return ParameterSpace(axes, self.names)
+
+
+class AdaptiveGrid:
+    """Coarse-to-fine subset of a :class:`ParameterSpace`. The active points start as a
+    coarse sub-grid with about *coarse_size* values per parameter, taken every :math:`s_d`
+    values of each axis with :math:`s_d` a power of two. Refining an active point of level
+    :math:`l` activates its neighbors at offsets :math:`\\{-s_d/2^{l+1}, 0, s_d/2^{l+1}\\}` along
+    every axis, which are of level :math:`l + 1`, until the resolution of the axes is reached.
+    The grid is therefore only fine around the refined points and the active points are
+    always points of the space, so that observations stay valid across refinements.
+
+    :param space: A :class:`ParameterSpace` at the finest resolution.
+    :param coarse_size: The number of values per parameter of the initial coarse grid.
+    """
+    def __init__(self, space, coarse_size):
+        self.space = space
+        self.lengths = numpy.array([len(axis) for axis in space.axes])
+        ratios = (self.lengths - 1) / max(1, coarse_size - 1)
+        self.strides = 2**numpy.ceil(numpy.log2(numpy.maximum(ratios, 1))).astype(int)
+        self.max_level = int(numpy.log2(self.strides.max()))
+
+        # the last value of every axis is kept in the coarse grid
+        values = [numpy.unique(numpy.r_[numpy.arange(0, n, stride), n - 1])
+                  for n, stride in zip(self.lengths, self.strides)]
+        value_indices = numpy.stack([numpy.ravel(v) for v in numpy.meshgrid(*values, indexing="ij")], axis=-1)
+        self.levels = dict.fromkeys(self.space.ravel(value_indices).tolist(), 0)
+        self.indices = numpy.array(sorted(self.levels))
+
+    @property
+    def size(self):
+        """The number of active points."""
+        return self.indices.shape[0]
+
+    def points(self):
+        """Decodes the active points.
+
+        :return: A 2d array of parameters, one row per active point, ordered as :attr:`indices`.
+        """
+        return self.space[self.indices]
+
+    def nearest(self, X):
+        """Finds the active points nearest to given parameters, the distances being measured
+        in values of every axis relative to its length.
+
+        :param X: A 2d array of parameters, one row per point.
+
+        :return: A 1-D array of indices in the space of the nearest active points, one per row.
+        """
+        X = numpy.asarray(X, dtype=float)
+        value_indices = numpy.stack([numpy.argmin(numpy.abs(axis[:, None] - X[:, d]), axis=0)
+                                     for d, axis in enumerate(self.space.axes)], axis=-1)
+        active = self.space.unravel(self.indices)
+        scale = numpy.maximum(self.lengths - 1, 1)
+        distances = numpy.sum(((value_indices[:, None] - active[None]) / scale)**2, axis=-1)
+        return self.indices[numpy.argmin(distances, axis=1)]
+
+    def refine(self, indices):
+        """Refines the grid around the active points at given *indices* of the space.
+
+        :param indices: A 1-D array of indices in the space of active points.
+
+        :return: The number of activated points.
+        """
+        added = 0
+        for index in numpy.unique(indices).tolist():
+            level = self.levels[index]
+            steps = self.strides >> (level + 1)
+            if not numpy.any(steps):
+                continue
+            center = self.space.unravel(index)
+            offsets = numpy.meshgrid(*[numpy.unique([-step, 0, step]) for step in steps], indexing="ij")
+            neighbors = center + numpy.stack([numpy.ravel(o) for o in offsets], axis=-1)
+            neighbors = neighbors[numpy.all((neighbors >= 0) & (neighbors < self.lengths), axis=1)]
+            for neighbor in self.space.ravel(neighbors).tolist():
+                if neighbor not in self.levels:
+                    self.levels[neighbor] = level + 1
+                    added += 1
+        if added > 0:
+            self.indices = numpy.array(sorted(self.levels))
+        return added
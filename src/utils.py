@@ -3,6 +3,7 @@
 """
 
 import os
+import warnings
 
 import numpy
 
@@ -10,6 +11,7 @@ from matplotlib import pyplot
 
 from scipy.optimize import curve_fit
 from scipy.spatial.distance import cdist
+from scipy.stats import qmc
 
 from skimage import filters
 
@@ -160,13 +162,72 @@ def find_first_max(data, start_idx=0):
     return data[-1], len(data) - 1
 
 
+def quasi_random_grid(axes, n_points, method="sobol"):
+    """Draws a low-discrepancy subset of the Cartesian grid defined by *axes* without
+    building the grid. Points of a scrambled Sobol or Halton sequence in the unit cube
+    are snapped to the grid, every grid value having an equal share of each axis, and
+    the duplicates are removed. A fresh subset is drawn on every call.
+
+    :param axes: A list of 1d arrays of grid values per parameter.
+    :param int n_points: The number of points to draw.
+    :param str method: The low-discrepancy sequence, `"sobol"` or `"halton"` (default: `"sobol"`).
+
+    :returns: A 2d array of at most *n_points* grid points, one per row. If the grid has
+              no more than *n_points* points, the whole grid is returned.
+    """
+    axes = [numpy.asarray(axis) for axis in axes]
+    shape = numpy.array([len(axis) for axis in axes])
+    if numpy.prod(shape.astype(float)) <= n_points:
+        grid = numpy.meshgrid(*axes)
+        return numpy.vstack([numpy.ravel(g) for g in grid]).T
+    if method == "sobol":
+        sampler = qmc.Sobol(len(axes), scramble=True)
+    elif method == "halton":
+        sampler = qmc.Halton(len(axes), scramble=True)
+    else:
+        raise ValueError("Unknown quasi-random method {}".format(method))
+    with warnings.catch_warnings():
+        # the balance properties of Sobol sequences only hold for powers of 2
+        warnings.simplefilter("ignore")
+        u = sampler.random(n_points)
+    idx = numpy.unique(numpy.minimum((u * shape).astype(int), shape - 1), axis=0)
+    return numpy.column_stack([axis[i] for axis, i in zip(axes, idx.T)])
+
+
+def pareto_front(points, maximize=None):
+    """Finds the non-dominated points, *i.e.* the points for which no other point is
+    at least as good on every objective and better on one. Each candidate of the front
+    removes all the points it dominates at once, so that the cost is linear in the number
+    of points for each point of the front. Among identical points, only one is kept.
+
+    :param points: A 2d array of objective values, one point per row.
+    :param maximize: A list of booleans, one per objective, True if the objective is
+                     maximized (default: None, every objective is minimized).
+
+    :returns: A 1-D array of the indices of the points of the front, in increasing order.
+    """
+    costs = numpy.asarray(points, dtype=float)
+    if maximize is not None:
+        costs = numpy.where(maximize, -costs, costs)
+    # starting from the best point of the first objective, which is on the front
+    indices = numpy.lexsort(costs.T[::-1])
+    costs = costs[indices]
+    i = 0
+    while i < costs.shape[0]:
+        keep = numpy.any(costs < costs[i], axis=1)
+        keep[i] = True
+        indices, costs = indices[keep], costs[keep]
+        i = numpy.sum(keep[:i]) + 1
+    return numpy.sort(indices)
+
+
 def plot_regression(objectives, algos, X_pred, param_idx, param_label, output, t):
     """Plots and saves the given prediction of the algorithms on the parameter
     space.
 
     :param objectives: List of objectives names.
     :param algos: List of algorithms dedicated to every objectives.
-    :param 2d-array X_pred: The parameter space.
+    :param X_pred: The parameter space, as a 2d-array or a :class:`space.ParameterSpace`.
     :param int param_idx: The id of the parameter.
     :param str param_label: The labels of the parameters.
     :param str output: The folder where to save the figures.
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of the optimization import each other from the source folder
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "src"))
@@ -0,0 +1,82 @@
+import copy
+import time
+
+import numpy
+
+import algorithms
+
+
+def shared_models(n, regularizations, sampler="fourier", seed=0):
+    """Models of several objectives observed at the same *n* random locations, sharing
+    their kernel factorization, with one regularization per objective."""
+    rng = numpy.random.default_rng(seed)
+    bandwidth = [0.5, 0.5, 0.5]
+    X = rng.random((n, 3))
+    kernel = algorithms.KernelFactor(bandwidth, max_factors=2 * len(regularizations))
+    algos = []
+    for i, lambda_ in enumerate(regularizations):
+        algo = algorithms.Kernel_TS(bandwidth, 1e-3, 0.1, sampler=sampler, kernel=kernel)
+        algo.observations.append(X, numpy.sin(3 * X[:, 0] + i) + rng.normal(0, 0.1, n))
+        algo.lambda_ = lambda_
+        algos.append(algo)
+    return algorithms.Kernel_TS_MultiObjective(algos), rng
+
+
+def fastest(function, repeat=3):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def test_grouped_predictions_match_every_objective():
+    model, rng = shared_models(200, [4e-4, 5e-4, 0.16])
+    X_pred = rng.random((50, 3))
+    assert model.groups() == [[0, 1, 2]]
+    means, stds = model.predict(X_pred)
+    for algo, mean, std in zip(model.algos, means, stds):
+        expected_mean, expected_std = algo.predict(X_pred)
+        numpy.testing.assert_allclose(mean, expected_mean, rtol=1e-8, atol=1e-10)
+        numpy.testing.assert_allclose(std, expected_std, rtol=1e-8, atol=1e-10)
+
+
+def test_grouped_sampling_is_not_slower_than_every_objective():
+    model, rng = shared_models(1500, [4e-4, 5e-4, 0.16])
+    X_sample = rng.random((2000, 3))
+    model.sample(X_sample)
+
+    def step(sample):
+        # every acquisition adds a location before the next options are sampled
+        x = rng.random((1, 3))
+        for algo in model.algos:
+            algo.observations.append(x, rng.normal(size=1))
+        sample()
+
+    grouped = fastest(lambda: step(lambda: model.sample(X_sample)))
+    separate = fastest(lambda: step(lambda: [algo.sample(X_sample) for algo in model.algos]))
+    assert grouped <= 1.2 * separate + 0.01
+
+
+def test_believe_extends_a_copy_without_changing_the_model():
+    model, rng = shared_models(100, [4e-4, 5e-4, 0.16])
+    model.update(rng.random((1, 3)), rng.normal(size=(1, 3)))
+    X_pred, actions = rng.random((20, 3)), rng.random((2, 3))
+    means, stds = model.predict(X_pred)
+    noise = [(algo.s_lb, algo.s_ub, algo.lambda_) for algo in model.algos]
+
+    believed = model.believe(actions)
+    expected = copy.deepcopy(model)
+    for algo, mean in zip(expected.algos, model.predict(actions)[0]):
+        algo.observations.append(actions, mean)
+    for result, reference in zip(believed.predict(X_pred), expected.predict(X_pred)):
+        numpy.testing.assert_allclose(result, reference, rtol=1e-8, atol=1e-10)
+    assert [(algo.s_lb, algo.s_ub, algo.lambda_) for algo in believed.algos] == noise
+    assert believed.groups() == [[0, 1, 2]]
+
+    # the model keeps its observations and factors, and is still updated in place
+    for result, reference in zip(model.predict(X_pred), (means, stds)):
+        numpy.testing.assert_allclose(result, reference)
+    model.update(actions, rng.normal(size=(2, 3)))
+    assert len(model.algos[0].observations) == 103
@@ -0,0 +1,17 @@
+import numpy
+
+import fsc
+
+
+def test_process_pools_are_reused_until_shut_down():
+    imgs = numpy.random.default_rng(0).poisson(5, (4, 64, 64)).astype(float)
+    expected = fsc.stack_spatial_frequency(imgs, 0.02)
+    numpy.testing.assert_allclose(fsc.stack_spatial_frequency(imgs, 0.02, n_workers=2), expected)
+    pool = fsc.process_pool(2)
+    assert fsc.process_pool(2) is pool
+
+    fsc.shutdown_pools()
+    assert fsc.pools == {}
+    numpy.testing.assert_allclose(fsc.stack_spatial_frequency(imgs, 0.02, n_workers=2), expected)
+    assert fsc.process_pool(2) is not pool
+    fsc.shutdown_pools()
@@ -0,0 +1,120 @@
+import os
+
+import numpy
+import pytest
+
+import create_config
+import optimization
+
+
+class Configuration:
+    """Stand-in for a :class:`specpy.Configuration` of the microscope."""
+    def __init__(self):
+        self.values = {"": {},
+                       "ExpControl/scan/range/x/psz": 20e-9,
+                       "ExpControl/scan/range/y/psz": 20e-9,
+                       "ExpControl/scan/dwelltime": 10e-6,
+                       "ExpControl/gating/linesteps/step_values": [1]}
+
+    def parameters(self, path):
+        return self.values[path]
+
+
+@pytest.fixture
+def make_optimizer(tmp_path):
+    def make(folder="run", **options):
+        config = create_config.create_config()
+        config["output"].update(saving_dir=str(tmp_path), folder=folder)
+        config["params"].update({"Dwelltime": True, "STED/Power": True})
+        config["params_space"].update({"Dwelltime": [10e-6, 100e-6, 5], "STED/Power": [0.1, 0.6, 5]})
+        config["objectives"].update({"Quality": True, "Bleach": True})
+        config.update(options)
+        return optimization.Optimizer(config, Configuration(), Configuration())
+    return make
+
+
+def test_cost_aware_never_selects_a_dominated_option(make_optimizer, monkeypatch):
+    optimizer = make_optimizer(cost_aware=True)
+    candidates = numpy.array([[10e-6, 0.1], [50e-6, 0.3], [100e-6, 0.6]])
+    monkeypatch.setattr(optimizer, "get_candidates", lambda: candidates)
+    # Quality is maximized and Bleach minimized: the first option is dominated by the second
+    samples = numpy.array([[0.2, 0.8, 0.5], [0.5, 0.1, 0.05]])
+    monkeypatch.setattr(optimizer.model, "sample", lambda X: samples)
+    monkeypatch.setattr(optimizer.model, "information_gain", lambda X: numpy.ones(len(X)))
+    # the dominated option is by far the cheapest, i.e. the most informative per second
+    monkeypatch.setattr(optimizer, "predict_cost", lambda X: X[:, 0] ** 2)
+
+    proposal = optimizer.propose(optimizer.model, 1)
+    assert list(proposal["front"]) == [1, 2]
+    assert proposal["choice"] == 0
+    numpy.testing.assert_array_equal(proposal["params"], candidates[1])
+
+
+def test_information_gain_is_the_same_in_chunks(make_optimizer):
+    optimizer = make_optimizer()
+    rng = numpy.random.default_rng(0)
+    X = numpy.array(optimizer.space[rng.choice(len(optimizer.space), 10)])
+    optimizer.model.update(X, rng.random((10, 2)))
+    X_pred = numpy.array(optimizer.space[numpy.arange(len(optimizer.space))])
+    numpy.testing.assert_allclose(optimizer.model.information_gain(X_pred, chunk_size=7),
+                                  optimizer.model.information_gain(X_pred, chunk_size=len(X_pred)))
+
+
+def test_save_step_writes_the_presented_options(make_optimizer, monkeypatch):
+    optimizer = make_optimizer(pareto_front=True, n_candidates=3)
+    candidates = numpy.array([[10e-6, 0.1], [50e-6, 0.3], [100e-6, 0.6]])
+    monkeypatch.setattr(optimizer, "get_candidates", lambda: candidates)
+    monkeypatch.setattr(optimizer.model, "sample", lambda X: numpy.array([[0.2, 0.8, 0.5], [0.5, 0.1, 0.05]]))
+    monkeypatch.setattr(optimization.user, "select", lambda o_t, *args: 1)
+
+    proposal = optimizer.propose(optimizer.model, 1)
+    optimizer.save_step(proposal, [0.7, 0.1], 1.5)
+    options = os.path.join(optimizer.output, "Options")
+    numpy.testing.assert_allclose(numpy.loadtxt(os.path.join(options, "0"), delimiter=","), [[0.8, 0.1], [0.5, 0.05]])
+    numpy.testing.assert_array_equal(numpy.loadtxt(os.path.join(options, "0_front"), dtype=int), [1, 2])
+    numpy.testing.assert_allclose(numpy.loadtxt(os.path.join(options, "0_candidates"), delimiter=","), candidates[1:])
+    with open(os.path.join(options, "choices")) as f:
+        assert f.read() == "0,1,1\n"
+    numpy.testing.assert_array_equal(proposal["params"], candidates[2])
+
+
+def acquire(optimizer, rng):
+    """Runs the steps of :func:`optimization.Optimizer.run` following an acquisition."""
+    proposal = optimizer.propose(optimizer.model, 1)
+    p_t, r_t, duration = proposal["params"], list(rng.random(2)), 1 + rng.random()
+    optimizer.cost_model.update([p_t], optimizer.cost_targets([p_t], [duration]))
+    optimizer.model.update([p_t], [r_t])
+    optimizer.checkpoint(optimizer.t + 1)
+    optimizer.check_convergence(optimizer.t + 1)
+    optimizer.save_step(proposal, r_t, duration)
+    optimizer.t += 1
+
+
+def test_resume_restores_the_checkpoint_and_replays_the_steps(make_optimizer, monkeypatch, tmp_path):
+    monkeypatch.setattr(optimization.user, "select", lambda o_t, *args: 0)
+    rng = numpy.random.default_rng(0)
+    first = make_optimizer(folder="first", checkpoint_every=3)
+    for _ in range(5):
+        acquire(first, rng)
+    assert first.checkpoint_t == 3
+
+    second = make_optimizer(folder="second", checkpoint_every=4,
+                            output={"saving_dir": str(tmp_path), "folder": "second", "previous": [None],
+                                    "resume": first.output})
+    assert second.t == 5
+    numpy.testing.assert_array_equal(second.algos[0].X, first.algos[0].X)
+    numpy.testing.assert_array_equal(second.algos[1].y, first.algos[1].y)
+    numpy.testing.assert_array_equal(second.cost_model.X, first.cost_model.X)
+    numpy.testing.assert_allclose(second.cost_model.y, first.cost_model.y)
+    assert second.controller.settled == first.controller.settled
+    numpy.testing.assert_array_equal(second.controller.probes, first.controller.probes)
+
+    # the times of the first optimization are kept by the checkpoints of the second one
+    acquire(second, rng)
+    assert second.checkpoint_t == 5
+    third = make_optimizer(folder="third", output={"saving_dir": str(tmp_path), "folder": "third",
+                                                   "previous": [None], "resume": second.output})
+    assert third.t == 6
+    numpy.testing.assert_array_equal(third.algos[0].X, second.algos[0].X)
+    numpy.testing.assert_array_equal(third.cost_model.X, second.cost_model.X)
+    numpy.testing.assert_allclose(third.cost_model.y, second.cost_model.y)